@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+'''Micro-benchmark of the element builders in docx.elements.
+
+Usage: python benchmarks/bench_elements.py [rows]
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docx.elements import paragraph, table
+from docx.utils import make_element
+
+
+def main(rows=2000):
+    contents = [['Column %d' % c for c in range(6)]]
+    contents += [['%d.%d' % (r, c) for c in range(6)] for r in range(rows)]
+    runs = [['some bold text', 'b'], ['some normal text', ''], ['some italic underlined text', 'iu']]
+    cases = [
+        ('make_element', lambda: make_element('jc', attributes={'val': 'left'}), 100000),
+        ('paragraph, 3 runs', lambda: paragraph(runs), 20000),
+        ('table, %d x 6 cells' % rows, lambda: table(contents), 3),
+    ]
+    for name, func, number in cases:
+        best = min(timeit.repeat(func, number=number, repeat=3))
+        print('%-28s %10.1f us/call' % (name, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+'''Import-time benchmark: how long a fresh interpreter takes to import
+docx modules, and which heavy dependencies each one pulls in.
+
+Every import runs in a new process, so nothing is cached between runs.
+The exit status is 1 when "import docx" loads any module of HEAVY.
+
+Usage: python benchmarks/bench_import.py [runs]
+'''
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules that "import docx" alone must not load
+HEAVY = ['lxml', 'PIL', 'zipfile', 'shutil']
+
+MODULES = ['docx', 'docx.elements', 'docx.document', 'docx.writer']
+
+SCRIPT = '''
+import sys, time
+sys.path.insert(0, %r)
+start = time.time()
+import %s
+elapsed = time.time() - start
+heavy = [name for name in %r if name in sys.modules]
+sys.stdout.write('%%r %%s' %% (elapsed, ','.join(heavy)))
+'''
+
+
+def time_import(module, runs):
+    times = []
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT % (ROOT, module, HEAVY)])
+        elapsed, heavy = output.decode('ascii').split(' ')
+        times.append(float(elapsed))
+    times.sort()
+    return times[0], times[len(times) // 2], [name for name in heavy.split(',') if name]
+
+
+def main(runs=10):
+    failed = False
+    for module in MODULES:
+        best, median, heavy = time_import(module, runs)
+        print('%-16s %8.1f ms best %8.1f ms median   loads: %s'
+              % (module, best * 1e3, median * 1e3, ', '.join(heavy) or '-'))
+        if module == 'docx' and heavy:
+            failed = True
+    if failed:
+        print('import docx loads heavy modules')
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
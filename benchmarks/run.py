@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+'''Benchmark suite for the document building, text and save paths.
+
+Synthetic documents of increasing size are generated on the fly: a
+minimal template package, paragraphs of many formatted runs, large
+tables and repeated pictures. Every case runs in a fresh process so its
+peak memory (ru_maxrss) is its own; the time reported is the best of a
+few repeats of the timed step alone, setup excluded.
+
+Usage:
+    python benchmarks/run.py                          run all cases
+    python benchmarks/run.py -k replace -s small      only some of them
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+
+Nothing is downloaded; only Linux (or any system with the resource
+module) is needed.
+'''
+import json
+import optparse
+import os
+import platform
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# Number of paragraphs, table rows and pictures for each size
+SIZES = {
+    'small': 1000,
+    'medium': 5000,
+    'large': 20000,
+}
+SIZE_ORDER = ['small', 'medium', 'large']
+
+RUNS_PER_PARAGRAPH = 8
+PICTURES_DIVISOR = 10  # a tenth as many pictures as paragraphs
+IMAGES = 5  # distinct images cycled through by the picture case
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+TEMPLATE_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/>'
+        '</Relationships>',
+    'word/_rels/document.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '</Relationships>',
+    'word/document.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<w:document xmlns:w="%s"><w:body>'
+        '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/></w:sectPr>'
+        '</w:body></w:document>' % W_NS,
+}
+
+
+def write_template(path):
+    package = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    for name, data in sorted(TEMPLATE_PARTS.items()):
+        package.writestr(name, data)
+    package.close()
+
+
+def write_png(path, width, height, seed):
+    '''Write a small truecolor PNG without needing Pillow.'''
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    row = b'\x00' + bytearray((seed * 37 + x) % 256 for x in range(width * 3))
+    pixels = zlib.compress(bytes(row) * height)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', pixels))
+        f.write(chunk(b'IEND', b''))
+
+
+def runs_for(i):
+    '''The runs of the i-th synthetic paragraph. Every paragraph holds a
+    {{name}} placeholder split over two runs and a plain one.'''
+    runs = [
+        ['Dear {{na', 'b'],
+        ['me}}, this is paragraph %d ' % i, ''],
+        ['with {{city}} in it, ', 'i'],
+    ]
+    while len(runs) < RUNS_PER_PARAGRAPH:
+        runs.append(['filler text %d of run %d, ' % (i, len(runs)), 'u' if len(runs) % 2 else ''])
+    return runs
+
+
+def build_document(workdir, count):
+    from docx.document import DocxDocument
+    from docx.elements import paragraph
+    document = DocxDocument(template_file=os.path.join(workdir, 'template.docx'))
+    for i in range(count):
+        document.add(paragraph(runs_for(i)))
+    return document
+
+
+# Cases: setup(workdir, count) returns the state for run(state), which is
+# the timed part and returns the number of items processed. Each repeat
+# gets a fresh state.
+
+def setup_add(workdir, count):
+    from docx.document import DocxDocument
+    from docx.elements import paragraph
+    document = DocxDocument(template_file=os.path.join(workdir, 'template.docx'))
+    document.body
+    return document, paragraph, count
+
+
+def run_add(state):
+    document, paragraph, count = state
+    for i in range(count):
+        document.add(paragraph(runs_for(i)))
+    return count
+
+
+def setup_table(workdir, count):
+    from docx.document import DocxDocument
+    from docx.elements import table
+    document = DocxDocument(template_file=os.path.join(workdir, 'template.docx'))
+    document.body
+    contents = [['Column %d' % c for c in range(6)]]
+    contents += [['%d.%d' % (r, c) for c in range(6)] for r in range(count)]
+    return document, table, contents
+
+
+def run_table(state):
+    document, table, contents = state
+    document.add(table(contents))
+    return len(contents) - 1
+
+
+def setup_picture(workdir, count):
+    from docx.document import DocxDocument
+    from docx.elements import picture
+    document = DocxDocument(template_file=os.path.join(workdir, 'template.docx'))
+    document.body
+    images = [os.path.join(workdir, 'image%d.png' % i) for i in range(IMAGES)]
+    return document, picture, images, max(count // PICTURES_DIVISOR, 1)
+
+
+def run_picture(state):
+    document, picture, images, count = state
+    for i in range(count):
+        document.add(picture(document, images[i % len(images)], 'Image %d' % i))
+    return count
+
+
+def setup_text(workdir, count):
+    return build_document(workdir, count), count
+
+
+def run_replace(state):
+    document, count = state
+    document.replace('{{city}}', 'Almaty')
+    return count
+
+
+def run_adv_replace(state):
+    from docx import advReplace
+    document, count = state
+    advReplace(document.document, '{{name}}', 'Rustem')
+    return count
+
+
+def run_document_adv_replace(state):
+    document, count = state
+    document.adv_replace('{{name}}', 'Rustem')
+    return count
+
+
+def run_search(state):
+    document, count = state
+    for term in ['paragraph %d ' % (count - 1), 'not in the document', 'city']:
+        document.search(term)
+    return count * 3
+
+
+def run_get_text(state):
+    document, count = state
+    document.get_text()
+    return count
+
+
+def setup_save(workdir, count):
+    document = build_document(workdir, count)
+    return document, os.path.join(workdir, 'out.docx'), count
+
+
+def _save(state, streaming):
+    document, filename, count = state
+    document.save(filename, streaming=streaming)
+    return count
+
+
+def run_save(state):
+    return _save(state, False)
+
+
+def run_save_streaming(state):
+    return _save(state, True)
+
+
+CASES = [
+    # name, setup, run, unit
+    ('add', setup_add, run_add, 'paragraphs'),
+    ('table', setup_table, run_table, 'rows'),
+    ('picture', setup_picture, run_picture, 'pictures'),
+    ('replace', setup_text, run_replace, 'paragraphs'),
+    ('advReplace', setup_text, run_adv_replace, 'paragraphs'),
+    ('adv_replace', setup_text, run_document_adv_replace, 'paragraphs'),
+    ('search', setup_text, run_search, 'paragraphs'),
+    ('get_text', setup_text, run_get_text, 'paragraphs'),
+    ('save', setup_save, run_save, 'paragraphs'),
+    ('save_streaming', setup_save, run_save_streaming, 'paragraphs'),
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(name, size, workdir, repeat):
+    '''Run one case in this process and return its result.'''
+    setup, run, unit = [(s, r, u) for n, s, r, u in CASES if n == name][0]
+    count = SIZES[size]
+    best = None
+    for i in range(repeat):
+        state = setup(workdir, count)
+        start = time.time()
+        items = run(state)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        del state
+    result = {
+        'case': name,
+        'size': size,
+        'items': items,
+        'unit': unit,
+        'seconds': best,
+        'per_second': items / best if best else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    output = os.path.join(workdir, 'out.docx')
+    if name.startswith('save') and os.path.exists(output):
+        result['output_bytes'] = os.path.getsize(output)
+    return result
+
+
+def prepare(workdir):
+    write_template(os.path.join(workdir, 'template.docx'))
+    for i in range(IMAGES):
+        write_png(os.path.join(workdir, 'image%d.png' % i), 64 + i, 48, i)
+
+
+def environment():
+    import lxml.etree
+    return {
+        'python': platform.python_version(),
+        'lxml': '.'.join(str(part) for part in lxml.etree.LXML_VERSION),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%d'),
+    }
+
+
+def compare(results, baseline):
+    previous = dict(((r['case'], r['size']), r) for r in baseline['results'])
+    print('')
+    print('%-16s %-7s %12s %12s %8s %10s' % ('case', 'size', 'baseline s', 'now s', 'speedup', 'rss delta'))
+    for result in results:
+        old = previous.get((result['case'], result['size']))
+        if old is None:
+            continue
+        print('%-16s %-7s %12.4f %12.4f %7.2fx %+9.1fM' % (
+            result['case'], result['size'], old['seconds'], result['seconds'],
+            old['seconds'] / result['seconds'] if result['seconds'] else 0,
+            result['peak_rss_mb'] - old['peak_rss_mb']))
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage=__doc__.split('Usage:')[1].split('Nothing')[0])
+    parser.add_option('-k', dest='cases', action='append', default=[],
+                      help='only run this case (may be repeated)')
+    parser.add_option('-s', dest='sizes', action='append', default=[],
+                      help='only run this size: %s' % ', '.join(SIZE_ORDER))
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='repeats per case, the best time is kept')
+    parser.add_option('--save', metavar='FILE', help='write the results as JSON')
+    parser.add_option('--compare', metavar='FILE', help='compare with saved results')
+    parser.add_option('--child', nargs=3, help=optparse.SUPPRESS_HELP)
+    options, args = parser.parse_args(argv)
+
+    if options.child:
+        name, size, workdir = options.child
+        sys.stdout.write(json.dumps(run_case(name, size, workdir, options.repeat)))
+        return 0
+
+    cases = [name for name, setup, run, unit in CASES if not options.cases or name in options.cases]
+    sizes = [size for size in SIZE_ORDER if not options.sizes or size in options.sizes]
+    workdir = tempfile.mkdtemp(prefix='docx-bench-')
+    results = []
+    try:
+        prepare(workdir)
+        print('%-16s %-7s %10s %14s %10s' % ('case', 'size', 'seconds', 'items/s', 'peak RSS'))
+        for size in sizes:
+            for name in cases:
+                output = subprocess.check_output([
+                    sys.executable, os.path.abspath(__file__),
+                    '--repeat', str(options.repeat), '--child', name, size, workdir])
+                result = json.loads(output.decode('utf-8'))
+                results.append(result)
+                print('%-16s %-7s %10.4f %14.0f %9.1fM' % (
+                    name, size, result['seconds'], result['per_second'] or 0, result['peak_rss_mb']))
+    finally:
+        shutil.rmtree(workdir)
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(results, json.load(f))
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'environment': environment(), 'sizes': SIZES, 'results': results},
+                      f, indent=1, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
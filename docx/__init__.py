@@ -7,17 +7,9 @@ Part of Python's docx module - http://github.com/mikemaccana/python-docx
 See LICENSE for licensing information.
 '''
 
-from lxml import etree
-try:
-    from PIL import Image
-except ImportError:
-    # BBB for broken PIL installations
-    import Image
-import zipfile
-import shutil
-import re
-import os
-from os.path import join
+# Only light modules are imported here: lxml, zipfile and the other
+# dependencies load with the submodules that use them, so that
+# "import docx" stays cheap for short-lived worker processes.
 
 # Record template directory's location which is just 'template' for a docx
 # developer or 'site-packages/docx-template' if you have installed docx
@@ -66,18 +58,18 @@ FILES_TO_IGNORE = (
 def advReplace(document,search,replace,bs=3):
     '''Replace all occurences of string with a different string, return updated document
     
-    This is a modified version of python-docx.replace() that takes into
-    account blocks of <bs> elements at a time. The replace element can also
-    be a string or an xml etree element.
+    This is a modified version of python-docx.replace() that finds matches
+    spanning several text blocks. The replace element can also be a string
+    or an xml etree element.
     
     What it does:
-    It searches the entire document body for text blocks.
-    Then scan thos text blocks for replace.
-    Since the text to search could be spawned across multiple text blocks,
-    we need to adopt some sort of algorithm to handle this situation.
-    The smaller matching group of blocks (up to bs) is then adopted.
-    If the matching group has more than one block, blocks other than first
-    are cleared and all the replacement text is put on first block.
+    The text blocks of every paragraph are joined once and searched in a
+    single pass, so all matches are found, including several per block.
+    Each match is mapped back to the blocks it covers through their
+    offsets in the joined text. The replacement text is put in the first
+    of those blocks, the matched parts of the others are removed and any
+    text around the match is kept where it was.
+    Matches spanning more than <bs> blocks are left alone.
     
     Examples:
     original text blocks : [ 'Hel', 'lo,', ' world!' ]
@@ -86,7 +78,7 @@ def advReplace(document,search,replace,bs=3):
     
     original text blocks : [ 'Hel', 'lo,', ' world!' ]
     search / replace: 'Hello, world' / 'Hi!'
-    output blocks : [ 'Hi!!', '', '' ]
+    output blocks : [ 'Hi!', '', '!' ]
     
     original text blocks : [ 'Hel', 'lo,', ' world!' ]
     search / replace: 'Hel' / 'Hal'
@@ -101,92 +93,9 @@ def advReplace(document,search,replace,bs=3):
     @return instance The document with replacement applied
     
     '''
-    # Enables debug output
-    DEBUG = False
-    
-    newdocument = document
-    
-    # Compile the search regexp
+    import re
+    from docx.index import TextIndex, _replace_in_runs
     searchre = re.compile(search)
-    
-    # Will match against searchels. Searchels is a list that contains last
-    # n text elements found in the document. 1 < n < bs
-    searchels = []
-    
-    for element in newdocument.iter():
-        if element.tag == '{%s}t' % NSPREFIXES['w']: # t (text) elements
-            if element.text:
-                # Add this element to searchels
-                searchels.append(element)
-                if len(searchels) > bs:
-                    # Is searchels is too long, remove first elements
-                    searchels.pop(0)
-                
-                # Search all combinations, of searchels, starting from
-                # smaller up to bigger ones
-                # l = search lenght
-                # s = search start
-                # e = element IDs to merge
-                found = False
-                for l in range(1,len(searchels)+1):
-                    if found:
-                        break
-                    #print "slen:", l
-                    for s in range(len(searchels)):
-                        if found:
-                            break
-                        if s+l <= len(searchels):
-                            e = range(s,s+l)
-                            #print "elems:", e
-                            txtsearch = ''
-                            for k in e:
-                                txtsearch += searchels[k].text
-                
-                            # Searcs for the text in the whole txtsearch
-                            match = searchre.search(txtsearch)
-                            if match:
-                                found = True
-                                
-                                # I've found something :)
-                                if DEBUG:
-                                    print "Found element!"
-                                    print "Search regexp:", searchre.pattern
-                                    print "Requested replacement:", replace
-                                    print "Matched text:", txtsearch
-                                    print "Matched text (splitted):", map(lambda i:i.text,searchels)
-                                    print "Matched at position:", match.start()
-                                    print "matched in elements:", e
-                                    if isinstance(replace, etree._Element):
-                                        print "Will replace with XML CODE"
-                                    elif type(replace) == list or type(replace) == tuple:
-                                        print "Will replace with LIST OF ELEMENTS"
-                                    else:
-                                        print "Will replace with:", re.sub(search,replace,txtsearch)
-
-                                curlen = 0
-                                replaced = False
-                                for i in e:
-                                    curlen += len(searchels[i].text)
-                                    if curlen > match.start() and not replaced:
-                                        # The match occurred in THIS element. Puth in the
-                                        # whole replaced text
-                                        if isinstance(replace, etree._Element):
-                                            # If I'm replacing with XML, clear the text in the
-                                            # tag and append the element
-                                            searchels[i].text = re.sub(search,'',txtsearch)
-                                            searchels[i].append(replace)
-                                        elif type(replace) == list or type(replace) == tuple:
-                                            # I'm replacing with a list of etree elements
-                                            searchels[i].text = re.sub(search,'',txtsearch)
-                                            for r in replace:
-                                                searchels[i].append(r)
-                                        else:
-                                            # Replacing with pure text
-                                            searchels[i].text = re.sub(search,replace,txtsearch)
-                                        replaced = True
-                                        if DEBUG:
-                                            print "Replacing in element #:", i
-                                    else:
-                                        # Clears the other text elements
-                                        searchels[i].text = ''
-    return newdocument
+    for paragraph, textels in TextIndex(document).runs():
+        _replace_in_runs(textels, searchre, replace, bs)
+    return document
@@ -0,0 +1,198 @@
+'''asyncio facade over DocxDocument.
+
+Every blocking call (reading the template, parsing, replacing,
+serializing and compressing, file I/O) runs on a bounded thread pool,
+so the event loop is never blocked. Methods return asyncio futures and
+are used with await; the module itself contains no async syntax and
+still compiles where asyncio is not available.
+
+example
+document = await AsyncDocx.open('letter.docx')
+await document.replace_many({'{{name}}': name})
+await document.save_async(writer)  # an asyncio StreamWriter
+
+A document is not thread safe: await each call before making the next.
+'''
+import multiprocessing
+import threading
+
+from docx.document import DocxDocument
+
+# Threads of the default executor; compression and parsing in lxml and
+# zlib release the GIL, so a few threads per CPU pay off
+DEFAULT_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def default_executor():
+    '''Return the thread pool shared by AsyncDocx instances created
+    without an executor of their own.'''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            workers = min(DEFAULT_WORKERS, multiprocessing.cpu_count() * 2)
+            _executor = ThreadPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def _get_loop(loop):
+    if loop is not None:
+        return loop
+    import asyncio
+    return asyncio.get_event_loop()
+
+
+def _then(loop, future, func):
+    '''Return a future of func(result of future)'''
+    result = loop.create_future()
+
+    def callback(future):
+        if future.cancelled():
+            result.cancel()
+        elif future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            try:
+                result.set_result(func(future.result()))
+            except Exception as exc:
+                result.set_exception(exc)
+    future.add_done_callback(callback)
+    return result
+
+
+def _load(document):
+    # Parse what every render needs now, on the executor, rather than on
+    # first access from the event loop
+    document.body
+    document.word_relationships
+    return document
+
+
+class AsyncDocx(object):
+    '''A DocxDocument whose operations run on an executor.
+
+    @param instance document: The DocxDocument to wrap
+    @param instance executor: A concurrent.futures thread pool, the shared
+                              default_executor() if omitted. Documents can
+                              not be pickled, so process pools do not work.
+    @param instance loop: Event loop, the current one if omitted
+    '''
+
+    def __init__(self, document, executor=None, loop=None):
+        self.document = document
+        self.executor = executor or default_executor()
+        self._loop = loop
+
+    @property
+    def loop(self):
+        return _get_loop(self._loop)
+
+    @classmethod
+    def open(cls, template_file=None, template_dir=None, compiled_template=None, executor=None, loop=None):
+        '''Return a future of an AsyncDocx, the template being read and
+        parsed on the executor.'''
+        executor = executor or default_executor()
+        loop = _get_loop(loop)
+        future = loop.run_in_executor(executor, lambda: _load(DocxDocument(
+            template_file=template_file, template_dir=template_dir, compiled_template=compiled_template)))
+        return _then(loop, future, lambda document: cls(document, executor, loop))
+
+    def run(self, func, *args, **kwargs):
+        '''Return a future of func(document, *args, **kwargs) called on the
+        executor, for anything without a method here.'''
+        return self.loop.run_in_executor(self.executor, lambda: func(self.document, *args, **kwargs))
+
+    def add(self, element, position=None):
+        return self.run(DocxDocument.add, element, position)
+
+    def replace(self, search, replace):
+        return self.run(DocxDocument.replace, search, replace)
+
+    def replace_many(self, mapping):
+        return self.run(DocxDocument.replace_many, mapping)
+
+    def adv_replace(self, search, replace, bs=3):
+        return self.run(DocxDocument.adv_replace, search, replace, bs)
+
+    def search(self, search):
+        return self.run(DocxDocument.search, search)
+
+    def get_text(self):
+        return self.run(DocxDocument.get_text)
+
+    def save_async(self, target=None, streaming=True, chunk_size=64 * 1024, compression=None):
+        '''Save the document without blocking the event loop.
+
+        @param mixed target: Where to save the document:
+            - None: the future's result is the document as bytes
+            - a path or a file object: written on the executor
+            - an asyncio StreamWriter, or anything with write() and a
+              drain() coroutine: each chunk is written then drained before
+              the next is built, so a slow client holds back the rendering
+              instead of filling memory
+            - a callable taking a chunk and returning an awaitable, such as
+              a wrapper around an ASGI send(); awaited the same way
+        @param bool streaming: Serialize document.xml element by element
+        @param int chunk_size: Approximate size of the chunks sent to a stream
+        @param mixed compression: CompressionPolicy or preset name, see save()
+
+        @return future Resolved once the whole package has been written
+        '''
+        if target is None or not (hasattr(target, 'drain') or callable(target)):
+            return self.run(DocxDocument.save, target, streaming, compression)
+        if hasattr(target, 'drain'):
+            def send(chunk):
+                target.write(chunk)
+                return target.drain()
+        else:
+            send = target
+        return self._send_chunks(send, streaming, chunk_size, compression)
+
+    def _send_chunks(self, send, streaming, chunk_size, compression):
+        # The chunks are built one at a time on the executor; the next one
+        # is only started once the previous one has been sent.
+        import asyncio
+        loop = self.loop
+        done = loop.create_future()
+        chunks = self.document.iter_save(chunk_size=chunk_size, streaming=streaming, compression=compression)
+
+        def fail(exc):
+            chunks.close()
+            if not done.done():
+                done.set_exception(exc)
+
+        def produce():
+            if done.cancelled():
+                chunks.close()
+                return
+            loop.run_in_executor(self.executor, next, chunks, None).add_done_callback(produced)
+
+        def produced(future):
+            if future.exception() is not None:
+                return fail(future.exception())
+            chunk = future.result()
+            if chunk is None:
+                if not done.done():
+                    done.set_result(None)
+                return
+            try:
+                sent = asyncio.ensure_future(send(chunk), loop=loop)
+            except Exception as exc:
+                return fail(exc)
+            sent.add_done_callback(after_send)
+
+        def after_send(future):
+            if future.cancelled():
+                chunks.close()
+                done.cancel()
+            elif future.exception() is not None:
+                fail(future.exception())
+            else:
+                produce()
+
+        produce()
+        return done
+
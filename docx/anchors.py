@@ -0,0 +1,97 @@
+import numbers
+
+from docx import NSPREFIXES
+
+W_P = '{%s}p' % NSPREFIXES['w']
+W_T = '{%s}t' % NSPREFIXES['w']
+W_BOOKMARK_START = '{%s}bookmarkStart' % NSPREFIXES['w']
+W_NAME = '{%s}name' % NSPREFIXES['w']
+W_SECTPR = '{%s}sectPr' % NSPREFIXES['w']
+
+
+class AnchorIndex(object):
+    '''The places of a body where DocxDocument.add() can insert content,
+    found in one walk of the tree so each insertion is a lookup.
+
+    A position is one of:
+        - an int: the index of a paragraph of the body as it was when the
+          index was built; content goes before that paragraph. Inserting
+          does not shift the indexes, so they stay those of the template.
+          The number of paragraphs means the end of the body, before its
+          final section properties.
+        - a bookmark name: content goes after the paragraph holding the
+          bookmark
+        - any other string: content goes after the first paragraph whose
+          text contains it, typically a placeholder such as '{{summary}}'.
+          The text of every paragraph is read once, with the bookmarks,
+          when it is indexed; paragraphs of added content come after
+          those of the template.
+
+    Content added at the same bookmark or text one call after the other
+    comes out in the order it was added: each of them keeps a cursor on
+    the last element inserted there. The anchor paragraphs themselves are
+    left in place.
+    '''
+
+    def __init__(self, body):
+        self.body = body
+        self.paragraphs = [el for el in body if el.tag == W_P]
+        self.bookmarks = {}
+        # (paragraph, text) of every paragraph, in the order indexed
+        self.texts = []
+        self._found = {}
+        self._cursors = {}
+        self.add(body)
+
+    def add(self, element):
+        '''Index the bookmarks and paragraph texts of an element added to
+        the body'''
+        for el in element.iter(W_BOOKMARK_START, W_P):
+            if el.tag == W_P:
+                self.texts.append((el, u''.join(t.text or u'' for t in el.iter(W_T))))
+                continue
+            name = el.get(W_NAME)
+            if name and name not in self.bookmarks:
+                paragraph = next(el.iterancestors(W_P), None)
+                self.bookmarks[name] = el if paragraph is None else paragraph
+
+    def find_text(self, text):
+        '''Return the first paragraph whose text contains text, or None'''
+        paragraph = self._found.get(text)
+        if paragraph is None:
+            paragraph = next((p for p, paratext in self.texts if text in paratext), None)
+            if paragraph is not None:
+                self._found[text] = paragraph
+        return paragraph
+
+    def end(self, element):
+        '''Add element at the end of the body, before its final section
+        properties'''
+        if len(self.body) and self.body[-1].tag == W_SECTPR:
+            self.body[-1].addprevious(element)
+        else:
+            self.body.append(element)
+        self.add(element)
+
+    def insert(self, element, position):
+        '''Insert element at position'''
+        if isinstance(position, numbers.Integral):
+            if position == len(self.paragraphs):
+                self.end(element)
+                return
+            try:
+                anchor = self.paragraphs[position]
+            except IndexError:
+                raise ValueError('Paragraph %d not found, the body has %d' % (position, len(self.paragraphs)))
+            anchor.addprevious(element)
+        else:
+            anchor = self._cursors.get(position)
+            if anchor is None:
+                anchor = self.bookmarks.get(position)
+                if anchor is None:
+                    anchor = self.find_text(position)
+                if anchor is None:
+                    raise ValueError('No bookmark or paragraph text "%s" found' % position)
+            anchor.addnext(element)
+            self._cursors[position] = element
+        self.add(element)
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sys
+import traceback
+
+from docx.template import CompiledTemplate
+
+# Per worker process state, set up once by _init_worker
+_template = None
+_render = None
+_out_dir = None
+
+
+def _replace_context(document, context):
+    # Word often splits a placeholder over several runs of a paragraph,
+    # which only adv_replace() matches
+    if hasattr(context, 'items'):
+        context = context.items()
+    for search, replace in context:
+        document.adv_replace(search, replace, bs=sys.maxsize)
+
+
+def _init_worker(template_file, render, out_dir):
+    global _template, _render, _out_dir
+    _template = CompiledTemplate(template_file)
+    _render = render
+    _out_dir = out_dir
+
+
+def _render_one(record):
+    '''Render and save one document, return (name, error or None)'''
+    name, context = record
+    try:
+        document = _template.render()
+        _render(document, context)
+        document.save(os.path.join(_out_dir, name))
+    except Exception:
+        return name, traceback.format_exc()
+    return name, None
+
+
+def render_batch(template, records, out_dir, workers=None, render=None, chunksize=16):
+    '''Render many documents from one template in parallel processes.
+
+    @param str    template: Path of the .docx template, compiled once per worker
+    @param iter   records: (filename, context) pairs, consumed lazily. Each
+                           document is saved as filename in out_dir.
+    @param str    out_dir: Directory receiving the documents
+    @param int    workers: Number of processes, defaults to the CPU count.
+                           1 renders in the calling process.
+    @param func   render: render(document, context) fills a document, must be
+                          a module level function so it can be pickled. The
+                          default calls document.adv_replace(search, replace)
+                          for each pair of context, a dict or a list of
+                          pairs, so placeholders split over several runs of
+                          a paragraph are replaced too. A render calling
+                          document.replace_many(context) is faster, but
+                          only replaces text within a single run.
+    @param int    chunksize: Records sent to a worker at a time
+
+    @return list  (filename, traceback) for every document that failed; a
+                  failure does not stop the rest of the batch.
+    '''
+    if render is None:
+        render = _replace_context
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    failures = []
+    if workers == 1:
+        _init_worker(template, render, out_dir)
+        results = (_render_one(record) for record in records)
+        for name, error in results:
+            if error is not None:
+                failures.append((name, error))
+        return failures
+    pool = multiprocessing.Pool(workers, _init_worker, (template, render, out_dir))
+    try:
+        for name, error in pool.imap_unordered(_render_one, records, chunksize):
+            if error is not None:
+                failures.append((name, error))
+    finally:
+        pool.close()
+        pool.join()
+    return failures
@@ -0,0 +1,90 @@
+import collections
+import re
+import threading
+
+from lxml import etree
+
+from docx import NSPREFIXES
+
+# Target of the processing instructions standing for blocks in a body
+BLOCK_TARGET = 'docx-block'
+BLOCK_MARKER = re.compile(b'<\\?' + BLOCK_TARGET.encode('ascii') + b' ([0-9]+)\\?>')
+
+
+class Block(object):
+    '''Body content used many times in documents: a disclaimer, a signature
+    table, a logo paragraph. The block is kept as one tree and serialized
+    once; each use is a marker spliced with the serialized bytes on save.
+
+    @param mixed content: An element or a list of elements, for instance
+                          made by paragraph() or table(). The block takes
+                          them over.
+
+    Blocks are opaque to the text methods (search, replace, get_text).
+    A block with a picture refers to the relationship picture() added to
+    one document, so it must only be used in that document.
+    '''
+
+    def __init__(self, content):
+        if isinstance(content, etree._Element):
+            content = [content]
+        self.elements = list(content)
+
+    def serialize(self, nsmap):
+        '''Return the block as UTF-8 bytes, using the prefixes of nsmap'''
+        # Serialized inside a wrapper declaring the document namespaces, the
+        # elements come out with the document's prefixes and no declarations.
+        wrapper = etree.Element('{%s}body' % NSPREFIXES['w'], nsmap=nsmap)
+        wrapper.extend(self.elements)
+        xml = etree.tostring(wrapper, encoding='utf-8', pretty_print=True)
+        return xml[xml.index(b'>') + 1:xml.rindex(b'</')].strip(b'\n')
+
+
+class BlockCache(object):
+    '''Serialized blocks, least recently used first out once their total
+    size exceeds maxsize bytes. Evicted blocks are simply serialized again
+    on their next use.'''
+
+    def __init__(self, maxsize=16 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, block, nsmap):
+        key = (block, tuple(sorted((prefix or '', uri) for prefix, uri in nsmap.items())))
+        with self._lock:
+            data = self._data.pop(key, None)
+            if data is not None:
+                self.hits += 1
+                self._data[key] = data
+                return data
+            self.misses += 1
+        data = block.serialize(nsmap)
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = data
+                self.size += len(data)
+                while self.size > self.maxsize and self._data:
+                    evicted_key, evicted = self._data.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+# Shared by every document unless one is given its own
+default_cache = BlockCache()
+
+
+def block_marker(key):
+    '''Return the body element standing for a block until the save'''
+    return etree.PI(BLOCK_TARGET, str(key))
+
+
+def is_block_marker(element):
+    return element.tag is etree.PI and element.target == BLOCK_TARGET
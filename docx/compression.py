@@ -0,0 +1,108 @@
+import fnmatch
+import os
+import zipfile
+
+# zlib's own default
+DEFAULT_LEVEL = 6
+
+# Content types of the parts a policy can be given types for, by extension
+EXTENSION_TYPES = {
+    'xml': 'application/xml',
+    'rels': 'application/vnd.openxmlformats-package.relationships+xml',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'wmf': 'image/x-wmf',
+    'emf': 'image/x-emf',
+    'tif': 'image/tiff',
+    'tiff': 'image/tiff',
+    'bmp': 'image/bmp',
+}
+
+# Formats compressed already, deflating them again gains next to nothing
+COMPRESSED_IMAGE_TYPES = ['image/png', 'image/jpeg', 'image/gif']
+
+
+def _pairs(mapping):
+    if hasattr(mapping, 'items'):
+        return list(mapping.items())
+    return list(mapping or [])
+
+
+class CompressionPolicy(object):
+    '''How each part written into a package is compressed.
+
+    A level is 0 to store a part as it is, or 1 to 9 to deflate it at that
+    zlib level. Word only reads stored and deflated parts, so these are the
+    only methods.
+
+    @param int   default: Level of the parts no rule matches
+    @param mixed parts: Levels by part name glob, e.g. {'word/media/*': 0}
+    @param mixed types: Levels by content type glob, e.g. {'image/*': 0},
+                        the type being found from the part's extension
+
+    parts and types are dicts, or lists of (glob, level) pairs when the
+    order they are tried in matters. Part rules come first.
+
+    Parts copied from a template keep the compression they have there.
+    '''
+
+    def __init__(self, default=DEFAULT_LEVEL, parts=None, types=None):
+        self.default = default
+        self.parts = _pairs(parts)
+        self.types = _pairs(types)
+        self._cache = {}
+
+    def level(self, partname):
+        '''Return the level for a part'''
+        level = self._cache.get(partname)
+        if level is None:
+            level = self._cache[partname] = self._level(partname)
+        return level
+
+    def _level(self, partname):
+        for pattern, level in self.parts:
+            if fnmatch.fnmatchcase(partname, pattern):
+                return level
+        if self.types:
+            extension = os.path.splitext(partname)[1][1:].lower()
+            content_type = EXTENSION_TYPES.get(extension)
+            if content_type is not None:
+                for pattern, level in self.types:
+                    if fnmatch.fnmatchcase(content_type, pattern):
+                        return level
+        return self.default
+
+    def compression(self, partname):
+        '''Return (compress_type, level) to write a part with'''
+        level = self.level(partname)
+        if not level:
+            return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, level
+
+
+PRESETS = {
+    # What save() has always done
+    'default': CompressionPolicy(),
+    # Interactive use: least CPU, images stored
+    'fast': CompressionPolicy(1, types=[(t, 0) for t in COMPRESSED_IMAGE_TYPES]),
+    # Archival: smallest files
+    'small': CompressionPolicy(9),
+    # Default level, but no time spent deflating PNG, JPEG and GIF again
+    'store_media': CompressionPolicy(types=[(t, 0) for t in COMPRESSED_IMAGE_TYPES]),
+    # No compression at all
+    'store': CompressionPolicy(0),
+}
+
+
+def compression_policy(policy=None):
+    '''Return the CompressionPolicy for a preset name, a policy or None
+    (the 'default' preset).'''
+    if policy is None:
+        return PRESETS['default']
+    if isinstance(policy, CompressionPolicy):
+        return policy
+    if policy not in PRESETS:
+        raise ValueError('Compression preset "%s" not implemented. Valid presets: %s.' % (policy, sorted(PRESETS)))
+    return PRESETS[policy]
@@ -1,19 +1,52 @@
 import collections
+import copy
+import io
 import os
 import zipfile
 import shutil
 import re
+import time
 
 from docx import FILES_TO_IGNORE, NSPREFIXES
-from docx.utils import make_element
+from docx.anchors import AnchorIndex
+from docx.index import TextIndex, _replace_in_runs
+from docx.media import MediaStore
+from docx.stats import DocxStats
+from docx.compression import compression_policy
+from docx.blocks import BLOCK_MARKER, block_marker, is_block_marker, default_cache
+from docx.utils import make_element, lazyproperty, MultiPattern, ZipMemberWriter, ChunkedOutput, \
+    copy_raw_member, write_raw_member, write_file_member, write_member, serialize_child, unicode
 from docx.meta import *
 
+# Template parts that are regenerated rather than copied on save
+REWRITTEN_PARTS = ['document.xml', 'document.xml.rels', '[Content_Types].xml']
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
 
 class DocxDocument(object):
-    def __init__(self, template_file=None, template_dir=None):
+    def __init__(self, template_file=None, template_dir=None, compiled_template=None):
         self.template_file = template_file
         self.template_dir = template_dir
-        if self.template_file and os.path.isfile(self.template_file):
+        self.compiled_template = compiled_template
+        self._text_index = None
+        self._anchors = None
+        self._parts = {}
+        # Parts set with set_part(), saved in place of the template's
+        self._changed_parts = set()
+        self.stats = DocxStats()
+        self._compression = compression_policy()
+        # Blocks added to the body, and the index of each in the list
+        self._blocks = []
+        self._block_keys = {}
+        self.block_cache = default_cache
+        with self.stats.phase('load'):
+            self._init(compiled_template)
+
+    def _init(self, compiled_template):
+        if compiled_template is not None:
+            self._init_from_compiled(compiled_template)
+        elif self.template_file and os.path.isfile(self.template_file):
             self._init_from_file(self.template_file)
         else:
             self.template_file = None
@@ -27,72 +60,242 @@ class DocxDocument(object):
             self.content_types = ContentTypes()
 
     def _init_from_file(self, template_file):
+        # Only the zip directory is read here, parts are parsed on first access
         self.template_zip = zipfile.ZipFile(self.template_file, 'r', compression=zipfile.ZIP_DEFLATED)
-        self.document = etree.fromstring(self.template_zip.read('word/document.xml'))
-        self.word_relationships = WordRelationships(xml=self.template_zip.read('word/_rels/document.xml.rels'))
-        #self.app_properties = AppProperties() # TODO: make available for manipulation
-        #self.core_properties = CoreProperties() # TODO: make available for manipulation
-        self.content_types = ContentTypes(xml=self.template_zip.read('[Content_Types].xml'))
-        self.body = self.document.xpath('/w:document/w:body', namespaces=NSPREFIXES)[0]
+
+    def _init_from_compiled(self, compiled_template):
+        self.template_file = compiled_template.template_file
+        self.document = copy.deepcopy(compiled_template.document)
+
+    def _loaded(self, name):
+        '''Tell whether a lazily loaded part has been accessed or set'''
+        return name in self.__dict__
+
+    def _read_part(self, partname):
+        if self.compiled_template is not None:
+            return self.compiled_template.read(partname)
+        return self.template_zip.read(partname)
+
+    def _parse_part(self, partname, parse=etree.fromstring):
+        '''Read a template part and parse it, recording both in stats'''
+        with self.stats.phase('parse'):
+            start = time.time()
+            data = self._read_part(partname)
+            result = parse(data)
+            if self.compiled_template is not None:
+                zinfo = self.compiled_template.getinfo(partname)
+            else:
+                zinfo = self.template_zip.getinfo(partname)
+            self.stats.part('load', partname, time.time() - start, zinfo.compress_size, len(data))
+        return result
+
+    def _has_part(self, partname):
+        return partname in self.part_names()
+
+    def part_names(self):
+        '''Return the names of the parts in the template package'''
+        if self.compiled_template is not None:
+            return self.compiled_template.part_names()
+        if self.template_file:
+            return self.template_zip.namelist()
+        return []
+
+    def media_names(self):
+        '''Return the names of the media parts in the template package'''
+        return [name for name in self.part_names() if name.startswith('word/media/')]
+
+    def get_part(self, partname):
+        '''Return a template part parsed as an element, such as a header or
+        footer. Parts are parsed once and cached; changes to them are not
+        saved unless the part is passed to set_part().'''
+        if partname not in self._parts:
+            self._parts[partname] = self._parse_part(partname)
+        return self._parts[partname]
+
+    def set_part(self, partname, element):
+        '''Save element as partname, in place of the template's part or as
+        a new part. A new part also needs a relationship and a content type.
+        With DocxWriter, parts must be set before the writer is opened.'''
+        self._parts[partname] = element
+        self._changed_parts.add(partname)
+
+    @lazyproperty
+    def document(self):
+        return self._parse_part('word/document.xml')
+
+    @lazyproperty
+    def body(self):
+        return self.document.xpath('/w:document/w:body', namespaces=NSPREFIXES)[0]
+
+    @lazyproperty
+    def word_relationships(self):
+        if self.compiled_template is not None:
+            return copy.deepcopy(self.compiled_template.word_relationships)
+        return self._parse_part('word/_rels/document.xml.rels', WordRelationships)
+
+    @lazyproperty
+    def content_types(self):
+        if self.compiled_template is not None:
+            return copy.deepcopy(self.compiled_template.content_types)
+        return self._parse_part('[Content_Types].xml', ContentTypes)
+
+    @lazyproperty
+    def media(self):
+        '''Images added through picture(), one part per distinct image'''
+        return MediaStore(self.word_relationships, self.media_names(), self.document)
+
+    @lazyproperty
+    def core_properties(self):
+        '''Core properties of the template, read only: the template's own
+        docProps/core.xml is the one saved.'''
+        if self._has_part('docProps/core.xml'):
+            return self._parse_part('docProps/core.xml', lambda xml: CoreProperties(xml=xml))
+        return None
+
+    @lazyproperty
+    def app_properties(self):
+        '''Application properties of the template, read only like core_properties'''
+        if self._has_part('docProps/app.xml'):
+            return self._parse_part('docProps/app.xml', lambda xml: AppProperties(xml=xml))
+        return None
+
+    @property
+    def text_index(self):
+        '''TextIndex of the document, built on first use and kept up to date
+        by add(), append() and the replace methods. Call
+        invalidate_text_index() after changing the tree by other means.'''
+        if self._text_index is None:
+            self._text_index = TextIndex(self.document)
+        return self._text_index
+
+    def invalidate_text_index(self):
+        self._text_index = None
+
+    @property
+    def anchors(self):
+        '''AnchorIndex of the body for add(position=...), built on first use
+        and kept up to date by add(). Call invalidate_anchors() after
+        removing or moving anchor paragraphs by other means.'''
+        if self._anchors is None:
+            self._anchors = AnchorIndex(self.body)
+        return self._anchors
+
+    def invalidate_anchors(self):
+        self._anchors = None
 
     def search(self, search):
         '''Search a document for a regex, return success / fail result'''
         result = False
         searchre = re.compile(search)
-        for element in self.document.iter():
-            if element.tag == '{%s}t' % NSPREFIXES['w']: # t (text) elements
-                if element.text:
-                    if searchre.search(element.text):
-                        result = element
+        for element in self.text_index.text_elements():
+            if element.text:
+                if searchre.search(element.text):
+                    result = element
         return result
 
     def replace(self, search, replace):
         '''Replace all occurences of string with a different string, return updated document'''
+        self.replace_many([(search, replace)])
+
+    def replace_many(self, mapping):
+        '''Apply several replacements in a single pass over the text elements.
+
+        mapping is a dict, or a list of (search, replace) pairs when the order
+        patterns are tried in matters. Each search is a regex, compiled or not,
+        and each replace is a string or an element, exactly as for replace().
+        The patterns are merged into one alternation when they can be, see
+        docx.utils.MultiPattern.'''
+        if hasattr(mapping, 'items'):
+            mapping = mapping.items()
+        patterns = MultiPattern(mapping)
+        if not patterns.patterns:
+            return
+        with self.stats.phase('replace'):
+            self._replace_many(patterns)
+
+    def _replace_many(self, patterns):
+        index = self.text_index
+        restructured = False
+        for paragraph, textels in index.runs():
+            for element in textels:
+                if not element.text:
+                    continue
+                text = element.text
+                pieces = []
+                last = 0
+                for i, match in patterns.finditer(text):
+                    replace = patterns.replacements[i]
+                    if not (isinstance(replace, str) or isinstance(replace, unicode)):
+                        element.getparent().replace(element, replace)
+                        restructured = True
+                        break
+                    pieces.append(text[last:match.start()])
+                    pieces.append(patterns.expand(i, match))
+                    last = match.end()
+                else:
+                    if pieces:
+                        pieces.append(text[last:])
+                        element.text = u''.join(pieces)
+                        index.touch(paragraph)
+        if restructured:
+            self.invalidate_text_index()
+
+    def adv_replace(self, search, replace, bs=3):
+        '''Replace a regex even when its match spans several text elements
+        of a paragraph, see docx.advReplace'''
         searchre = re.compile(search)
-        for element in self.document.iter():
-            if element.tag == '{%s}t' % NSPREFIXES['w']: # t (text) elements
-                if element.text:
-                    if searchre.search(element.text):
-                        if isinstance(replace, str) or isinstance(replace, unicode):
-                            element.text = re.sub(search,replace,element.text)
-                        else:
-                            parent = element.getparent()
-                            parent.replace(element, replace)
-                            #element.addnext(element)
+        with self.stats.phase('adv_replace'):
+            index = self.text_index
+            for paragraph, textels in index.runs():
+                if _replace_in_runs(textels, searchre, replace, bs):
+                    index.touch(paragraph)
+        if not (isinstance(replace, str) or isinstance(replace, unicode)):
+            self.invalidate_text_index()
 
     def add(self, element, position=None):
-        if position:
-            # TODO: enable adding stuff to at specific points of the text.
-            pass
-        else:
-            self.body.append(element)
+        '''Add an element to the body, at the end or at a position: a
+        paragraph index, a bookmark name or a paragraph's text, see
+        docx.anchors.AnchorIndex.'''
+        if position is not None:
+            self.anchors.insert(element, position)
+            # The text index only knows how to add at the end of the document
+            self.invalidate_text_index()
+            return
+        self.body.append(element)
+        if self._text_index is not None:
+            self._text_index.add(element)
+        if self._anchors is not None:
+            self._anchors.add(element)
+
+    def add_block(self, block):
+        '''Add a docx.blocks.Block at the end of the body. The body only
+        holds a marker; the block's serialized bytes, shared by all its
+        uses, replace it when the document is saved.'''
+        key = self._block_keys.get(block)
+        if key is None:
+            key = self._block_keys[block] = len(self._blocks)
+            self._blocks.append(block)
+        self.add(block_marker(key))
+
+    def _block_bytes(self, key):
+        return self.block_cache.get(self._blocks[int(key)], self.document.nsmap)
 
     def get_text(self):
         '''Return the raw text of a document, as a list of paragraphs.'''
         paratextlist=[]   
-        # Compile a list of all paragraph (p) elements
-        paralist = []
-        for element in self.document.iter():
-            # Find p (paragraph) elements
-            if element.tag == '{'+NSPREFIXES['w']+'}p':
-                paralist.append(element)    
-        # Since a single sentence might be spread over multiple text elements, iterate through each 
-        # paragraph, appending all text (t) children to that paragraphs text.     
-        for para in paralist:      
-            paratext = u''  
-            # Loop through each paragraph
-            for element in para.iter():
-                # Find t (text) elements
-                if element.tag == '{'+NSPREFIXES['w']+'}t':
-                    if element.text:
-                        paratext = paratext+element.text
-            # Add our completed paragraph text to the list of paragraph text    
+        index = self.text_index
+        # Since a single sentence might be spread over multiple text elements,
+        # the index holds the text of each paragraph joined together.
+        for para in index.paragraphs():
+            paratext = index.text(para)[0]
             if not len(paratext) == 0:
                 paratextlist.append(paratext)                    
         return paratextlist
 
     def append(self, element):
         self.document.append(element)
+        if self._text_index is not None:
+            self._text_index.add(element)
 
 #    def _clean(self):
 #        """ Perform misc cleaning operations on documents.
@@ -119,8 +322,9 @@ class DocxDocument(object):
             self.word_relationships:'word/_rels/document.xml.rels'
         }
         for f in files:
-            treestring = etree.tostring(f._xml(), pretty_print=True)
-            self.zip_file.writestr(files[f],treestring)
+            with self.stats.writing(self.zip_file):
+                treestring = etree.tostring(f._xml(), pretty_print=True)
+                self._write_member(files[f],treestring)
 
     def _copy_template_dir(self):
         """Copy a template document to our container."""
@@ -129,39 +333,177 @@ class DocxDocument(object):
                 if filename in FILES_TO_IGNORE:
                     continue
                 path = os.path.join(dirpath, filename)
-                self.zip_file.write(path, os.path.relpath(path, self.template_dir))
+                partname = os.path.relpath(path, self.template_dir)
+                if partname in self._changed_parts:
+                    continue
+                with self.stats.writing(self.zip_file):
+                    self._write_file_member(path, partname)
 
     def _copy_template_file(self):
         """ Copy contents of template docx file into new docx file """
-        for filename in self.template_zip.namelist():
-            if os.path.basename(filename) in ['document.xml' , 'document.xml.rels', '[Content_Types].xml']:
+        if self.compiled_template is not None:
+            for zinfo, data in self.compiled_template.members:
+                if zinfo.filename in self._changed_parts:
+                    continue
+                with self.stats.writing(self.zip_file):
+                    write_raw_member(self.zip_file, zinfo, data)
+            return
+        # Parts are copied as stored: no inflating and deflating again
+        for zinfo in self.template_zip.infolist():
+            if os.path.basename(zinfo.filename) in REWRITTEN_PARTS or zinfo.filename in self._changed_parts:
                 continue
-            self.zip_file.writestr(filename, self.template_zip.read(filename))
+            with self.stats.writing(self.zip_file):
+                copy_raw_member(self.template_zip, zinfo, self.zip_file)
 
     def _copy_media_files(self):
+        if self._loaded('media'):
+            for item in self.media:
+                with self.stats.writing(self.zip_file):
+                    item.write(self.zip_file, *self._compression.compression('word/' + item.partname))
         for name, path in self.word_relationships.to_copy:
             out = 'word/media/' + name # IN DESPERATE NEED OF A FIX
-            self.zip_file.write(path, out)
+            with self.stats.writing(self.zip_file):
+                self._write_file_member(path, out)
+
+    def _write_member(self, partname, data):
+        write_member(self.zip_file, partname, data, *self._compression.compression(partname))
+
+    def _write_file_member(self, path, partname):
+        write_file_member(self.zip_file, path, partname, *self._compression.compression(partname))
 
-    def save(self, filename):
-        '''Save a modified document'''
-        self.zip_file = zipfile.ZipFile(filename, mode='w', compression=zipfile.ZIP_DEFLATED)
+    def _write_document(self):
+        with self.stats.writing(self.zip_file):
+            xml = etree.tostring(self.document, pretty_print=True, xml_declaration=True, encoding="utf-8")
+            if self._blocks:
+                xml = BLOCK_MARKER.sub(lambda match: self._block_bytes(match.group(1)), xml)
+            self._write_member('word/document.xml', xml)
+
+    def _stream_document(self):
+        """ Serialize document.xml element by element straight into the zip,
+            so no serialized copy of the whole body is ever built. Yields
+            after each element of the body. """
+        with self.stats.writing(self.zip_file):
+            with ZipMemberWriter(self.zip_file, 'word/document.xml',
+                                 *self._compression.compression('word/document.xml')) as member:
+                nsmap = self.document.nsmap
+                with etree.xmlfile(member, encoding='utf-8') as xf:
+                    xf.write_declaration(standalone=True)
+                    with xf.element(self.document.tag, dict(self.document.attrib), nsmap=nsmap):
+                        # Elements are written as bytes: xf.write() would
+                        # declare every namespace again on each of them
+                        for child in self.document:
+                            if child.tag != self.body.tag:
+                                xf.flush()
+                                member.write(serialize_child(child, nsmap))
+                                continue
+                            with xf.element(child.tag, dict(child.attrib)):
+                                xf.flush()
+                                for element in child:
+                                    if is_block_marker(element):
+                                        member.write(self._block_bytes(element.text))
+                                    else:
+                                        member.write(serialize_child(element, nsmap))
+                                    yield
+
+    def _write_template_parts(self):
         # TODO: determine what to do when template_file AND template_dir are specified
         if self.template_dir:
-            self._write_xml_files()
             self._copy_template_dir()
         if self.template_file:
             self._copy_template_file()
-            self.zip_file.writestr('word/_rels/document.xml.rels',
-                                    etree.tostring(self.word_relationships._xml(),
-                                    pretty_print=True, xml_declaration=True, encoding="utf-8"))
-            self.zip_file.writestr('[Content_Types].xml',
-                                    etree.tostring(self.content_types._xml(),
-                                    pretty_print=True, xml_declaration=True, encoding="utf-8"))
+
+    def _write_package_parts(self):
+        if self.template_dir:
+            self._write_xml_files()
+        if self.template_file:
+            # Parts never loaded are unchanged; new media always come with
+            # relationships, which then need matching content types.
+            if self._loaded('word_relationships') or self._loaded('content_types'):
+                with self.stats.writing(self.zip_file):
+                    self._write_member('word/_rels/document.xml.rels',
+                                       etree.tostring(self.word_relationships._xml(),
+                                       pretty_print=True, xml_declaration=True, encoding="utf-8"))
+                with self.stats.writing(self.zip_file):
+                    self._write_member('[Content_Types].xml',
+                                       etree.tostring(self.content_types._xml(),
+                                       pretty_print=True, xml_declaration=True, encoding="utf-8"))
+            else:
+                self._copy_template_part('word/_rels/document.xml.rels')
+                self._copy_template_part('[Content_Types].xml')
+        for partname in sorted(self._changed_parts):
+            with self.stats.writing(self.zip_file):
+                self._write_member(partname, etree.tostring(self._parts[partname], xml_declaration=True,
+                                                            encoding='utf-8', standalone=True))
 
         # Copying over any newly added media files.
-        self._copy_media_files()
-        # Adding the content file.
-        self.zip_file.writestr('word/document.xml', etree.tostring(self.document, pretty_print=True, xml_declaration=True, encoding="utf-8"))
-        
-        # self.zip_file.close()
+        if self._loaded('word_relationships'):
+            with self.stats.phase('media'):
+                self._copy_media_files()
+
+    def _copy_template_part(self, partname):
+        with self.stats.writing(self.zip_file):
+            if self.compiled_template is not None:
+                self.compiled_template.copy_member(partname, self.zip_file)
+            else:
+                copy_raw_member(self.template_zip, self.template_zip.getinfo(partname), self.zip_file)
+
+    def _save(self, output, streaming, compression):
+        """ Write the package into output step by step, yielding between
+            steps so that what has been written so far can be sent on. """
+        self._compression = compression_policy(compression)
+        with self.stats.phase('save'):
+            self.zip_file = zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED)
+            try:
+                with self.stats.phase('template_parts'):
+                    self._write_template_parts()
+                yield
+                with self.stats.phase('package_parts'):
+                    self._write_package_parts()
+                yield
+                # Adding the content file.
+                with self.stats.phase('document'):
+                    if not self._loaded('document'):
+                        self._copy_template_part('word/document.xml')
+                    elif streaming:
+                        for step in self._stream_document():
+                            yield
+                    else:
+                        self._write_document()
+            finally:
+                # Writes the central directory; a file object passed in is
+                # left open
+                self.zip_file.close()
+
+    def save(self, filename=None, streaming=False, compression=None):
+        '''Save a modified document
+
+        filename is a path or a writable binary file object, which does not
+        need to be seekable. Without one the document is returned as bytes.
+
+        With streaming=True document.xml is written incrementally, keeping
+        peak memory independent of the document length.
+
+        compression is a docx.compression.CompressionPolicy or the name of a
+        preset: 'default', 'fast', 'small', 'store_media' or 'store'.'''
+        output = io.BytesIO() if filename is None else filename
+        for step in self._save(output, streaming, compression):
+            pass
+        if filename is None:
+            return output.getvalue()
+
+    def iter_save(self, chunk_size=64 * 1024, streaming=True, compression=None):
+        '''Save the document as an iterator of byte strings of about
+        chunk_size bytes, produced while the package is being built. It can
+        be returned as is as the body of a WSGI response.
+
+        example
+        start_response('200 OK', [('Content-Type', DOCX_CONTENT_TYPE)])
+        return document.iter_save()
+        '''
+        output = ChunkedOutput()
+        for step in self._save(output, streaming, compression):
+            if output.size >= chunk_size:
+                yield output.drain()
+        data = output.drain()
+        if data:
+            yield data
@@ -1,9 +1,6 @@
-import os
-
-from PIL import Image
 from lxml import etree
 
-from utils import make_element
+from docx.utils import make_element, sub_element, ElementCache, unicode
 
 
 def pagebreak(type='page', orient='portrait'):
@@ -33,6 +30,60 @@ def pagebreak(type='page', orient='portrait'):
     return pagebreak
 
 
+def _paragraph_properties(style, jc):
+    pPr = make_element('pPr')
+    sub_element(pPr, 'pStyle', attributes={'val':style})
+    sub_element(pPr, 'jc', attributes={'val':jc})
+    return pPr
+
+
+def _run_properties(style):
+    rPr = make_element('rPr')
+    # Apply styles
+    if style.find('b') > -1:
+        sub_element(rPr, 'b')
+    if style.find('u') > -1:
+        sub_element(rPr, 'u', attributes={'val':'single'})
+    if style.find('i') > -1:
+        sub_element(rPr, 'i')
+    return rPr
+
+
+def _cell_properties(width, unit, heading):
+    cellprops = make_element('tcPr')
+    sub_element(cellprops, 'tcW', attributes={'w':width,'type':unit})
+    if heading:
+        sub_element(cellprops, 'shd', attributes={'val':'clear','color':'auto','fill':'548DD4','themeFill':'text2','themeFillTint':'99'})
+    return cellprops
+
+
+def _text_cell(width, unit, heading, jc):
+    '''A cell holding one paragraph with an empty text element, see _set_cell_text()'''
+    cell = make_element('tc')
+    cell.append(_cell_properties(width, unit, heading))
+    cell.append(paragraph('', jc=jc))
+    return cell
+
+
+def _cell_align(celstyle, i):
+    if celstyle and 'align' in celstyle[i].keys():
+        return celstyle[i]['align']
+    return 'left'
+
+
+def _set_cell_text(cell, text):
+    if text:
+        # tc / p / r / t
+        cell[1][-1][-1].text = text
+
+
+# Property subtrees are built once per distinct value and copied after that
+_paragraph_properties_cache = ElementCache(_paragraph_properties)
+_run_properties_cache = ElementCache(_run_properties)
+_cell_properties_cache = ElementCache(_cell_properties)
+_text_cell_cache = ElementCache(_text_cell)
+
+
 def paragraph(paratext,style='BodyText',breakbefore=False,jc='left'):
     '''Make a new paragraph element, containing a run, and some text. 
     Return the paragraph element.
@@ -61,40 +112,22 @@ def paragraph(paratext,style='BodyText',breakbefore=False,jc='left'):
         text = []
         for pt in paratext:
             if type(pt) == list:
-                text.append([make_element('t',tagtext=pt[0]), pt[1]])
+                text.append([pt[0], pt[1]])
             else:
-                text.append([make_element('t',tagtext=pt), ''])
+                text.append([pt, ''])
     else:
-        text = [[make_element('t',tagtext=paratext),''],]
-    pPr = make_element('pPr')
-    pStyle = make_element('pStyle',attributes={'val':style})
-    pJc = make_element('jc',attributes={'val':jc})
-    pPr.append(pStyle)
-    pPr.append(pJc)
+        text = [[paratext,''],]
+    paragraph.append(_paragraph_properties_cache.get(style, jc))
                 
     # Add the text the run, and the run to the paragraph
-    paragraph.append(pPr)
     for t in text:
-        run = make_element('r')
-        rPr = make_element('rPr')
-        # Apply styles
-        if t[1].find('b') > -1:
-            b = make_element('b')
-            rPr.append(b)
-        if t[1].find('u') > -1:
-            u = make_element('u',attributes={'val':'single'})
-            rPr.append(u)
-        if t[1].find('i') > -1:
-            i = make_element('i')
-            rPr.append(i)
-        run.append(rPr)
+        run = sub_element(paragraph, 'r')
+        run.append(_run_properties_cache.get(t[1]))
         # Insert lastRenderedPageBreak for assistive technologies like
         # document narrators to know when a page break occurred.
         if breakbefore:
-            lastRenderedPageBreak = make_element('lastRenderedPageBreak')
-            run.append(lastRenderedPageBreak)
-        run.append(t[0])
-        paragraph.append(run)
+            sub_element(run, 'lastRenderedPageBreak')
+        sub_element(run, 't', tagtext=t[0])
     # Return the combined paragraph
     return paragraph
 
@@ -107,15 +140,11 @@ def heading(headingtext,headinglevel,lang='en'):
     }
     # Make our elements
     paragraph = make_element('p')
-    pr = make_element('pPr')
-    pStyle = make_element('pStyle',attributes={'val':lmap[lang]+str(headinglevel)})    
-    run = make_element('r')
-    text = make_element('t',tagtext=headingtext)
+    pr = sub_element(paragraph, 'pPr')
+    sub_element(pr, 'pStyle', attributes={'val':lmap[lang]+str(headinglevel)})
     # Add the text the run, and the run to the paragraph
-    pr.append(pStyle)
-    run.append(text)
-    paragraph.append(pr)   
-    paragraph.append(run)    
+    run = sub_element(paragraph, 'r')
+    sub_element(run, 't', tagtext=headingtext)
     # Return the combined paragraph
     return paragraph
 
@@ -156,51 +185,44 @@ def table(contents, heading=True, colw=None, cwunit='dxa', tblw=0, twunit='auto'
     table = make_element('tbl')
     columns = len(contents[0])
     # Table properties
-    tableprops = make_element('tblPr')
-    tablestyle = make_element('tblStyle',attributes={'val':'ColorfulGrid-Accent1'})
-    tableprops.append(tablestyle)
-    tablewidth = make_element('tblW',attributes={'w':str(tblw),'type':str(twunit)})
-    tableprops.append(tablewidth)
+    tableprops = sub_element(table, 'tblPr')
+    sub_element(tableprops, 'tblStyle', attributes={'val':'ColorfulGrid-Accent1'})
+    sub_element(tableprops, 'tblW', attributes={'w':str(tblw),'type':str(twunit)})
     if len(borders.keys()):
-        tableborders = make_element('tblBorders')
+        tableborders = sub_element(tableprops, 'tblBorders')
         for b in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
             if b in borders.keys() or 'all' in borders.keys():
                 k = 'all' if 'all' in borders.keys() else b
                 attrs = {}
                 for a in borders[k].keys():
                     attrs[a] = unicode(borders[k][a])
-                borderelem = make_element(b,attributes=attrs)
-                tableborders.append(borderelem)
-        tableprops.append(tableborders)
-    tablelook = make_element('tblLook',attributes={'val':'0400'})
-    tableprops.append(tablelook)
-    table.append(tableprops)    
+                sub_element(tableborders, b, attributes=attrs)
+    sub_element(tableprops, 'tblLook', attributes={'val':'0400'})
     # Table Grid    
-    tablegrid = make_element('tblGrid')
+    tablegrid = sub_element(table, 'tblGrid')
     for i in range(columns):
-        tablegrid.append(make_element('gridCol',attributes={'w':str(colw[i]) if colw else '2390'}))
-    table.append(tablegrid)     
+        sub_element(tablegrid, 'gridCol', attributes={'w':str(colw[i]) if colw else '2390'})
+    # Cell widths, per column
+    if colw:
+        widths = [(str(w), cwunit) for w in colw]
+    else:
+        widths = [('0', 'auto')] * columns
     # Heading Row    
     row = make_element('tr')
-    rowprops = make_element('trPr')
-    cnfStyle = make_element('cnfStyle',attributes={'val':'000000100000'})
-    rowprops.append(cnfStyle)
-    row.append(rowprops)
+    rowprops = sub_element(row, 'trPr')
+    sub_element(rowprops, 'cnfStyle', attributes={'val':'000000100000'})
     if heading:
         i = 0
         for heading in contents[0]:
-            cell = make_element('tc')  
+            if not isinstance(heading, (list, tuple, etree._Element)):
+                cell = _text_cell_cache.get(widths[i][0], widths[i][1], True, 'center')
+                _set_cell_text(cell, heading)
+                row.append(cell)
+                i += 1
+                continue
+            cell = sub_element(row, 'tc')
             # Cell properties  
-            cellprops = make_element('tcPr')
-            if colw:
-                wattr = {'w':str(colw[i]),'type':cwunit}
-            else:
-                wattr = {'w':'0','type':'auto'}
-            cellwidth = make_element('tcW',attributes=wattr)
-            cellstyle = make_element('shd',attributes={'val':'clear','color':'auto','fill':'548DD4','themeFill':'text2','themeFillTint':'99'})
-            cellprops.append(cellwidth)
-            cellprops.append(cellstyle)
-            cell.append(cellprops)        
+            cell.append(_cell_properties_cache.get(widths[i][0], widths[i][1], True))
             # Paragraph (Content)
             if not type(heading) == list and not type(heading) == tuple:
                 heading = [heading,]
@@ -209,24 +231,23 @@ def table(contents, heading=True, colw=None, cwunit='dxa', tblw=0, twunit='auto'
                     cell.append(h)
                 else:
                     cell.append(paragraph(h,jc='center'))
-            row.append(cell)
             i += 1
         table.append(row)          
     # Contents Rows
     for contentrow in contents[1 if heading else 0:]:
-        row = make_element('tr')     
+        row = sub_element(table, 'tr')
         i = 0
         for content in contentrow:   
-            cell = make_element('tc')
+            if not isinstance(content, (list, tuple, etree._Element)):
+                align = _cell_align(celstyle, i)
+                cell = _text_cell_cache.get(widths[i][0], widths[i][1], False, align)
+                _set_cell_text(cell, content)
+                row.append(cell)
+                i += 1
+                continue
+            cell = sub_element(row, 'tc')
             # Properties
-            cellprops = make_element('tcPr')
-            if colw:
-                wattr = {'w':str(colw[i]),'type':cwunit}
-            else:
-                wattr = {'w':'0','type':'auto'}
-            cellwidth = make_element('tcW',attributes=wattr)
-            cellprops.append(cellwidth)
-            cell.append(cellprops)
+            cell.append(_cell_properties_cache.get(widths[i][0], widths[i][1], False))
             # Paragraph (Content)
             if not type(content) == list and not type(content) == tuple:
                 content = [content,]
@@ -234,14 +255,8 @@ def table(contents, heading=True, colw=None, cwunit='dxa', tblw=0, twunit='auto'
                 if isinstance(c, etree._Element):
                     cell.append(c)
                 else:
-                    if celstyle and 'align' in celstyle[i].keys():
-                        align = celstyle[i]['align']
-                    else:
-                        align = 'left'
-                    cell.append(paragraph(c,jc=align))
-            row.append(cell)    
+                    cell.append(paragraph(c,jc=_cell_align(celstyle, i)))
             i += 1
-        table.append(row)   
     return table
 
 
@@ -252,12 +267,15 @@ def picture(document, picname, picdescription, pixelwidth=None,
     # http://openxmldeveloper.org/articles/462.aspx
     # Create an image. Size may be specified, otherwise it will based on the
     # pixel size of image. Return a paragraph containing the picture'''  
-    document.word_relationships.to_copy.append([picname, os.path.abspath(picname)])
+    # Identical images share one media part and relationship
+    picid = document.media.drawing_id()
+    media = document.media.add(picname)
+    picrelid = media.relid
 
     # Check if the user has specified a size
     if not pixelwidth or not pixelheight:
         # If not, get info from the picture itself
-        pixelwidth,pixelheight = Image.open(picname).size[0:2]
+        pixelwidth,pixelheight = media.size
 
     # OpenXML measures on-screen objects in English Metric Units
     # 1cm = 36000 EMUs            
@@ -265,14 +283,6 @@ def picture(document, picname, picdescription, pixelwidth=None,
     width = str(pixelwidth * emuperpixel)
     height = str(pixelheight * emuperpixel)   
     
-    # Set relationship ID to the first available  
-    picid = '2'
-    picrelid = 'rId'+str(len(document.word_relationships.relationshiplist) + 1)
-    picid = str(len(document.word_relationships.relationshiplist) + 1)
-    document.word_relationships.relationshiplist.append([
-        picrelid, 
-        'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image',
-        'media/'+picname])
     # There are 3 main elements inside a picture
     # 1. The Blipfill - specifies how the image fills the picture area (stretch, tile, etc.)
     blipfill = make_element('blipFill',nsprefix='pic')
@@ -0,0 +1,74 @@
+import zipfile
+
+from lxml import etree
+
+from docx import NSPREFIXES
+
+W_P = '{%s}p' % NSPREFIXES['w']
+W_T = '{%s}t' % NSPREFIXES['w']
+W_TR = '{%s}tr' % NSPREFIXES['w']
+
+
+def _release(element):
+    '''Free a finished element and the siblings already handled before it'''
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_text(source, partname='word/document.xml'):
+    '''Yield the raw text of each paragraph of a .docx file, like get_text()
+    does, without building the document tree.
+
+    The part is parsed as a stream straight out of the zip and every
+    paragraph is thrown away once its text is out, so memory stays bounded
+    by the largest paragraph. A paragraph nested in another one, as in a
+    text box, has its own text and comes after the paragraph holding it.
+
+    @param mixed source: Path or file object of the .docx, or an open
+                         zipfile.ZipFile
+    @param str   partname: Part to read, such as 'word/header1.xml'
+    '''
+    if isinstance(source, zipfile.ZipFile):
+        zip_file = source
+    else:
+        zip_file = zipfile.ZipFile(source, 'r')
+    try:
+        stream = zip_file.open(partname)
+        try:
+            for paratext in _paragraph_texts(stream):
+                yield paratext
+        finally:
+            stream.close()
+    finally:
+        if zip_file is not source:
+            zip_file.close()
+
+
+def _paragraph_texts(stream):
+    # Text of the paragraphs started within the outermost open one, in
+    # document order, and the indexes of those still open in that list.
+    # Text goes to the innermost open paragraph only, as in get_text().
+    texts = []
+    open_paragraphs = []
+    for event, element in etree.iterparse(stream, events=('start', 'end'), tag=(W_P, W_T, W_TR)):
+        if element.tag == W_T:
+            if event == 'end' and element.text and open_paragraphs:
+                texts[open_paragraphs[-1]].append(element.text)
+        elif element.tag == W_P:
+            if event == 'start':
+                open_paragraphs.append(len(texts))
+                texts.append([])
+                continue
+            open_paragraphs.pop()
+            if not open_paragraphs:
+                _release(element)
+                for paratext in texts:
+                    paratext = u''.join(paratext)
+                    if paratext:
+                        yield paratext
+                texts = []
+        elif event == 'end' and not open_paragraphs:
+            _release(element)
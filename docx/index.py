@@ -0,0 +1,114 @@
+import bisect
+import collections
+
+from lxml import etree
+
+from docx import NSPREFIXES
+
+W_P = '{%s}p' % NSPREFIXES['w']
+W_T = '{%s}t' % NSPREFIXES['w']
+
+
+class TextIndex(object):
+    '''The paragraphs of a tree in document order, with their text (t)
+    elements and joined text, so text operations need not walk every
+    formatting node of the document.
+
+    Text elements belong to their nearest enclosing paragraph; the few that
+    sit outside any paragraph are grouped under their parent element.
+    '''
+
+    def __init__(self, root=None):
+        # paragraph -> list of its t elements
+        self._runs = collections.OrderedDict()
+        # paragraph -> (joined text, start offset of every t element)
+        self._texts = {}
+        if root is not None:
+            self.add(root)
+
+    def add(self, element):
+        '''Index an element that was added at the end of the document'''
+        runs = self._runs
+        for el in element.iter(W_P, W_T):
+            if el.tag == W_P:
+                runs.setdefault(el, [])
+                continue
+            paragraph = next(el.iterancestors(W_P), None)
+            if paragraph is None:
+                paragraph = el.getparent()
+            runs.setdefault(paragraph, []).append(el)
+            self._texts.pop(paragraph, None)
+
+    def touch(self, paragraph):
+        '''Forget the cached text of a paragraph whose text elements changed'''
+        self._texts.pop(paragraph, None)
+
+    def runs(self):
+        '''Return (paragraph, [t elements]) pairs in document order'''
+        return self._runs.items()
+
+    def text_elements(self):
+        '''Yield every indexed t element in document order'''
+        for textels in self._runs.values():
+            for el in textels:
+                yield el
+
+    def paragraphs(self):
+        '''Return the paragraph (p) elements in document order'''
+        return [p for p in self._runs if p.tag == W_P]
+
+    def text(self, paragraph):
+        '''Return the joined text of a paragraph and the start offset of each
+        of its t elements in that text'''
+        try:
+            return self._texts[paragraph]
+        except KeyError:
+            pass
+        texts = [el.text or u'' for el in self._runs[paragraph]]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text)
+        self._texts[paragraph] = result = (u''.join(texts), starts)
+        return result
+
+
+def _replace_in_runs(textels, searchre, replace, bs):
+    '''Replace every match of searchre in the text of a list of t elements,
+    read as one string. Return the number of replacements made.'''
+    textels = [el for el in textels if el.text]
+    texts = [el.text for el in textels]
+    # starts[i] is the offset of texts[i] in the joined text
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+    matches = [m for m in searchre.finditer(u''.join(texts)) if m.end() > m.start()]
+    isxml = isinstance(replace, etree._Element) or type(replace) == list or type(replace) == tuple
+    done = 0
+    # Going backwards keeps the offsets of earlier matches valid
+    for match in reversed(matches):
+        first = bisect.bisect_right(starts, match.start()) - 1
+        last = bisect.bisect_right(starts, match.end() - 1) - 1
+        if last - first >= bs:
+            continue
+        head = texts[first][:match.start() - starts[first]]
+        tail = texts[last][match.end() - starts[last]:]
+        if isxml:
+            texts[first] = head
+            elements = [replace] if isinstance(replace, etree._Element) else replace
+            for r in elements:
+                textels[first].append(r)
+        else:
+            texts[first] = head + match.expand(replace)
+        for i in range(first + 1, last + 1):
+            texts[i] = u''
+        texts[last] += tail
+        done += 1
+    if done:
+        for el, text in zip(textels, texts):
+            if el.text != text:
+                el.text = text
+    return done
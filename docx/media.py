@@ -0,0 +1,216 @@
+import hashlib
+import os
+import struct
+
+from docx import NSPREFIXES
+from docx.meta import IMAGE_RELATIONSHIP
+from docx.utils import write_file_member
+
+
+# JPEG start-of-frame markers, which carry the image size
+_JPEG_SOF = set(range(0xC0, 0xD0)) - set([0xC4, 0xC8, 0xCC])
+# Marker of an Aldus placeable metafile, the usual kind of .wmf file
+_WMF_PLACEABLE = b'\xd7\xcd\xc6\x9a'
+WP_DOCPR = '{%s}docPr' % NSPREFIXES['wp']
+
+
+def _png_size(f, head):
+    if head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+
+
+def _gif_size(f, head):
+    return struct.unpack('<HH', head[6:10])
+
+
+def _jpeg_size(f, head):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0:1] != b'\xff':
+            return None
+        code = ord(marker[1:2])
+        if code == 0xFF:
+            # Fill byte before the actual marker
+            f.seek(-1, 1)
+            continue
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            # Markers without a payload
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if code in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _wmf_size(f, head):
+    left, top, right, bottom, inch = struct.unpack('<hhhhH', head[6:16])
+    if not inch:
+        return None
+    # Placeable metafiles give their bounds in units per inch. picture()
+    # turns pixels into 12667 EMU each, about 72 per inch of 914400 EMU,
+    # so the metafile keeps its physical size at 72 pixels per inch.
+    return (int(round(abs(right - left) * 72.0 / inch)),
+            int(round(abs(bottom - top) * 72.0 / inch)))
+
+
+def _probe(f):
+    head = f.read(32)
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return _png_size(f, head)
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return _gif_size(f, head)
+    if head.startswith(b'\xff\xd8'):
+        return _jpeg_size(f, head)
+    if head.startswith(_WMF_PLACEABLE):
+        return _wmf_size(f, head)
+    return None
+
+
+def image_size(path):
+    '''Return the (width, height) of an image in pixels.
+
+    PNG, GIF, JPEG and placeable WMF sizes are read from the file header
+    alone. Other formats fall back to Pillow, which is only imported
+    then.'''
+    with open(path, 'rb') as f:
+        try:
+            size = _probe(f)
+        except (struct.error, IOError):
+            size = None
+    if size:
+        return tuple(size)
+    try:
+        from PIL import Image
+    except ImportError:
+        # BBB for broken PIL installations
+        import Image
+    return Image.open(path).size[0:2]
+
+
+def _file_digest(path, chunk_size=64 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaItem(object):
+    '''One image stored in the package, however often it is placed.
+    stored is True for an image the package holds already, which is not
+    written again.'''
+
+    def __init__(self, digest, path, partname, relid, stored=False):
+        self.digest = digest
+        self.path = path
+        self.partname = partname
+        self.relid = relid
+        self.stored = stored
+        self._size = None
+
+    @property
+    def size(self):
+        '''Pixel (width, height) of the image, read once.'''
+        if self._size is None:
+            self._size = image_size(self.path)
+        return self._size
+
+    def write(self, zip_file, compress_type=None, level=None):
+        write_file_member(zip_file, self.path, 'word/' + self.partname, compress_type, level)
+
+
+class MediaStore(object):
+    '''Images added to a document, keyed by the sha1 of their bytes.
+
+    The same picture inserted any number of times, from any path, ends up
+    as one word/media part with one relationship. Files are hashed once
+    per (path, mtime, size), so repeated calls do not read them again.
+    Drawing ids are numbered after those of the drawings in document.'''
+
+    def __init__(self, relationships, existing=(), document=None):
+        self.relationships = relationships
+        self.document = document
+        self._by_digest = {}
+        self._by_file = {}
+        self._names = set(os.path.basename(name) for name in existing)
+        self._names.update(os.path.basename(r[2]) for r in relationships.of_type(IMAGE_RELATIONSHIP))
+        self._drawing_id = None
+
+    def __len__(self):
+        return len(self._added())
+
+    def __iter__(self):
+        '''Iterate over the images to write, not those registered'''
+        return iter(self._added())
+
+    def _added(self):
+        return [item for item in self._by_digest.values() if not item.stored]
+
+    def _digest(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+        if key not in self._by_file:
+            self._by_file[key] = _file_digest(path)
+        return self._by_file[key]
+
+    def _partname(self, filename, digest):
+        name = os.path.basename(filename)
+        if name in self._names:
+            stem, ext = os.path.splitext(name)
+            name = '%s-%s%s' % (stem, digest[:8], ext)
+        self._names.add(name)
+        return 'media/' + name
+
+    def add(self, path):
+        '''Add an image file and return its MediaItem, reusing the stored
+        one if an image with the same bytes was added before.'''
+        digest = self._digest(path)
+        item = self._by_digest.get(digest)
+        if item is None:
+            partname = self._partname(path, digest)
+            relid = self.relationships.add(IMAGE_RELATIONSHIP, partname)
+            item = MediaItem(digest, os.path.abspath(path), partname, relid)
+            self._by_digest[digest] = item
+        elif item.path is None:
+            # A registered image, whose size can now be read
+            item.path = os.path.abspath(path)
+        return item
+
+    def register(self, data, partname, relid):
+        '''Make an image the package holds already, with its bytes data and
+        relationship relid, the one reused for images with the same bytes.'''
+        digest = hashlib.sha1(data).hexdigest()
+        if digest not in self._by_digest:
+            self._by_digest[digest] = MediaItem(digest, None, partname, relid, stored=True)
+        return self._by_digest[digest]
+
+    def drawing_id(self):
+        '''Return a new id for a drawing object. Every placement needs its
+        own, even when the image is shared.'''
+        if self._drawing_id is None:
+            # Relationship ids say nothing about the drawings of the
+            # template, which may well share an image, so look at those.
+            ids = [0]
+            if self.document is not None:
+                ids.extend(int(el.get('id')) for el in self.document.iter(WP_DOCPR)
+                           if el.get('id', '').isdigit())
+            self._drawing_id = max(ids)
+        self._drawing_id += 1
+        return str(self._drawing_id)
+
+    def write(self, zip_file, policy=None):
+        '''Write each stored image once into the package, compressed as
+        the CompressionPolicy policy says.'''
+        for item in self:
+            if policy is None:
+                item.write(zip_file)
+            else:
+                item.write(zip_file, *policy.compression('word/' + item.partname))
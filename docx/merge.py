@@ -0,0 +1,390 @@
+'''Merge many documents into one, streaming.
+
+Each source's body is read element by element and written straight into
+a DocxWriter, so memory holds one source's relationships and styles and
+one body element at a time, however many sources there are.
+
+example
+merge(['customer1.docx', 'customer2.docx'], 'print.docx')
+
+with DocxMerger('print.docx', template_file='letterhead.docx') as merger:
+    for path in paths:
+        merger.add(path)
+'''
+import copy
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+
+from lxml import etree
+
+from docx import NSPREFIXES
+from docx.elements import pagebreak
+from docx.meta import WordRelationships, IMAGE_RELATIONSHIP, RELATIONSHIP_TYPES
+from docx.writer import DocxWriter
+
+W_NS = NSPREFIXES['w']
+R_NS = '{%s}' % NSPREFIXES['r']
+W_BODY = '{%s}body' % W_NS
+W_SECTPR = '{%s}sectPr' % W_NS
+W_STYLES = '{%s}styles' % W_NS
+W_STYLE = '{%s}style' % W_NS
+W_STYLE_ID = '{%s}styleId' % W_NS
+W_DEFAULT = '{%s}default' % W_NS
+W_NAME = '{%s}name' % W_NS
+W_VAL = '{%s}val' % W_NS
+# Elements naming a style, in the body and in other styles
+STYLE_REFERENCES = ['{%s}%s' % (W_NS, tag) for tag in ('pStyle', 'rStyle', 'tblStyle')]
+STYLE_LINKS = ['{%s}%s' % (W_NS, tag) for tag in ('basedOn', 'next', 'link')]
+# Parts of a section that are not merged: sections keep the output's
+SECTION_REFERENCES = ['{%s}%s' % (W_NS, tag) for tag in ('headerReference', 'footerReference', 'printerSettings')]
+WP_DOCPR = '{%s}docPr' % NSPREFIXES['wp']
+
+STYLES_RELATIONSHIP = RELATIONSHIP_TYPES + 'styles'
+STYLES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml'
+# Extensions ContentTypes always declares a default content type for
+DEFAULT_EXTENSIONS = ['png', 'jpeg', 'gif', 'wmf']
+
+
+def _style_key(style):
+    '''A style's definition, its id left out, to find identical ones'''
+    style = copy.deepcopy(style)
+    style.attrib.pop(W_STYLE_ID, None)
+    style.attrib.pop(W_DEFAULT, None)
+    return etree.tostring(style)
+
+
+class StyleMerger(object):
+    '''The styles part of the output, with each definition indexed so a
+    source style identical to one already there is mapped onto it.'''
+
+    def __init__(self, styles):
+        self.styles = styles
+        self.added = 0
+        self._ids = set()
+        self._keys = {}
+        for style in styles.iter(W_STYLE):
+            self._ids.add(style.get(W_STYLE_ID))
+            self._keys.setdefault(_style_key(style), style.get(W_STYLE_ID))
+
+    def merge(self, style, resolve):
+        '''Return the output id of a source style, adding the style if no
+        identical one exists. resolve maps the source ids the style links
+        to (basedOn, next, link) to output ids.'''
+        style = copy.deepcopy(style)
+        for link in style.iterchildren(*STYLE_LINKS):
+            link.set(W_VAL, resolve(link.get(W_VAL)))
+        key = _style_key(style)
+        styleid = self._keys.get(key)
+        if styleid is not None:
+            return styleid
+        # Same id, different definition: the source's style gets a new id
+        base = styleid = style.get(W_STYLE_ID)
+        suffix = 1
+        while styleid in self._ids:
+            suffix += 1
+            styleid = '%s%d' % (base, suffix)
+        style.set(W_STYLE_ID, styleid)
+        name = style.find(W_NAME)
+        if name is not None and suffix > 1:
+            name.set(W_VAL, '%s %d' % (name.get(W_VAL), suffix))
+        # The output's default styles stay the defaults
+        style.attrib.pop(W_DEFAULT, None)
+        self.styles.append(style)
+        self._ids.add(styleid)
+        self._keys[key] = styleid
+        self.added += 1
+        return styleid
+
+
+class _Source(object):
+    '''A document being merged: its zip, relationships, styles and content
+    types, and the ids already mapped to the output's.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path, 'r')
+        names = set(self.zip.namelist())
+        self.relationships = WordRelationships(self.zip.read('word/_rels/document.xml.rels'))
+        self.styles = {}
+        if 'word/styles.xml' in names:
+            for style in etree.fromstring(self.zip.read('word/styles.xml')).iter(W_STYLE):
+                self.styles[style.get(W_STYLE_ID)] = style
+        types = etree.fromstring(self.zip.read('[Content_Types].xml'))
+        self.default_types = dict((t.get('Extension', '').lower(), t.get('ContentType'))
+                                  for t in types if t.tag.endswith('Default'))
+        self.override_types = dict((t.get('PartName'), t.get('ContentType'))
+                                   for t in types if t.tag.endswith('Override'))
+        self.relids = {}
+        self.styleids = {}
+
+    def content_type(self, partname):
+        content_type = self.override_types.get('/' + partname)
+        if content_type is None:
+            extension = posixpath.splitext(partname)[1][1:].lower()
+            content_type = self.default_types.get(extension)
+        return content_type
+
+    def body(self):
+        '''Yield the elements of the body one at a time, each dropped from
+        the source tree once the caller is done with it.'''
+        depth = 0
+        with self.zip.open('word/document.xml') as stream:
+            for event, element in etree.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                body = element.getparent()
+                if depth == 2 and body.tag == W_BODY:
+                    yield element
+                    # Written elements have been moved out of the tree already
+                    if element.getparent() is body:
+                        body.remove(element)
+
+    def close(self):
+        self.zip.close()
+
+
+class DocxMerger(object):
+    '''Merge documents one after the other into a new package.
+
+    @param mixed filename: Path or writable file object of the output
+    @param string template_file: Package the output is based on: styles,
+                                 settings, headers, footers and the final
+                                 section. The first source if omitted, its
+                                 body then coming first as it is.
+    @param mixed compression: CompressionPolicy or preset name, see
+                              DocxDocument.save()
+
+    Sources are separated by section breaks, so each keeps its own page
+    setup but the last, which ends with the output's final section.
+    Relationships are remapped to the output's: images are stored once
+    per distinct content, hyperlinks once per URL. Styles identical to one
+    already in the output are mapped onto it, others are added, under a
+    new id if theirs is taken. Headers and footers of the sources, and
+    other parts such as charts, embedded objects, comments, footnotes and
+    numbering definitions, are not merged; references to unsupported
+    parts raise a ValueError.
+    '''
+
+    def __init__(self, filename, template_file=None, compression=None):
+        self.filename = filename
+        self.template_file = template_file
+        self.compression = compression
+        self.writer = None
+        self.sources = 0
+        self._styles = None
+        self._break = None
+        # (CRC-32, size) of the images merged so far -> {sha1: relationship id}
+        self._images = {}
+        self._tmpdir = None
+
+    @property
+    def stats(self):
+        return self.writer.stats
+
+    def open(self, template_file=None):
+        '''Start the output. Called by the first add() when not called
+        before, with that source as the template if none was given.'''
+        template_file = self.template_file or template_file
+        if template_file is None:
+            raise ValueError('A template_file or a first source is needed to open the merger')
+        self.writer = DocxWriter(self.filename, template_file=template_file, compression=self.compression)
+        template = self.writer.template
+        # The styles part is rewritten with the styles merged in
+        if template._has_part('word/styles.xml'):
+            styles = template.get_part('word/styles.xml')
+        else:
+            styles = etree.Element(W_STYLES, nsmap={'w': W_NS})
+            template.word_relationships.get_or_add(STYLES_RELATIONSHIP, 'styles.xml')
+            template.content_types.types['/word/styles.xml'] = STYLES_CONTENT_TYPE
+        template.set_part('word/styles.xml', styles)
+        self._styles = StyleMerger(styles)
+        # Sources often carry the template's own images
+        for relationship in template.word_relationships.of_type(IMAGE_RELATIONSHIP):
+            partname = posixpath.normpath(posixpath.join('word', relationship[2]))
+            if len(relationship) < 4 and template._has_part(partname):
+                item = template.media.register(template._read_part(partname), relationship[2], relationship[0])
+                zinfo = template.template_zip.getinfo(partname)
+                self._images.setdefault((zinfo.CRC, zinfo.file_size), {})[item.digest] = item.relid
+        self._tmpdir = tempfile.mkdtemp(prefix='docx-merge-')
+        self.writer.open()
+        return self
+
+    def add(self, path):
+        '''Append the body of the document at path'''
+        if self.writer is None:
+            self.open(path)
+            if self.template_file is None:
+                # The writer has written the body of its template, this
+                # source, already
+                self.sources += 1
+                self._end_source(self.writer._sectpr)
+                return
+        source = _Source(path)
+        try:
+            with self.stats.phase('merge'):
+                if self._break is not None:
+                    self.writer.add(self._break)
+                sectpr = None
+                for element in source.body():
+                    if element.tag == W_SECTPR:
+                        sectpr = element
+                        continue
+                    self._remap(source, element)
+                    self.writer.add(element)
+                self._end_source(sectpr, source)
+            self.sources += 1
+        finally:
+            source.close()
+
+    def _end_source(self, sectpr, source=None):
+        # The section break before the next source ends this one, with its
+        # page setup. The last source ends with the output's own section.
+        orient = 'portrait'
+        if sectpr is not None:
+            size = sectpr.find('{%s}pgSz' % W_NS)
+            if size is not None and size.get('{%s}orient' % W_NS) == 'landscape':
+                orient = 'landscape'
+        self._break = pagebreak(type='section', orient=orient)
+        if sectpr is not None:
+            sectpr = copy.deepcopy(sectpr)
+            if source is not None:
+                self._remap(source, sectpr)
+            else:
+                self._strip_section(sectpr)
+            properties = self._break[0]
+            properties.replace(properties[0], sectpr)
+
+    def _strip_section(self, element):
+        for el in list(element.iter(*SECTION_REFERENCES)):
+            el.getparent().remove(el)
+
+    def _remap(self, source, element):
+        self._strip_section(element)
+        for el in element.iter(etree.Element):
+            for name, value in el.attrib.items():
+                if name.startswith(R_NS):
+                    el.set(name, self._relid(source, value))
+            if el.tag in STYLE_REFERENCES:
+                el.set(W_VAL, self._styleid(source, el.get(W_VAL)))
+            elif el.tag == WP_DOCPR:
+                el.set('id', self.writer.media.drawing_id())
+
+    def _relid(self, source, relid):
+        '''Return the output relationship id for a source's relid'''
+        if relid in source.relids:
+            return source.relids[relid]
+        relationship = source.relationships.get(relid)
+        if relationship is None:
+            return relid
+        reltype, target = relationship[1], relationship[2]
+        mode = relationship[3] if len(relationship) > 3 else None
+        if mode == 'External':
+            new = self.writer.word_relationships.get_or_add(reltype, target, mode)
+        elif reltype == IMAGE_RELATIONSHIP:
+            new = self._add_image(source, target)
+        else:
+            raise ValueError('%s: relationship %s of type %s can not be merged' % (source.path, relid, reltype))
+        source.relids[relid] = new
+        return new
+
+    def _add_image(self, source, target):
+        if target.startswith('/'):
+            partname = target[1:]
+        else:
+            partname = posixpath.normpath(posixpath.join('word', target))
+        # The zip directory gives the CRC and size of every image for free:
+        # only an image that may have been seen before is hashed, then
+        # reused only if the hash is that of the image seen before
+        zinfo = source.zip.getinfo(partname)
+        key = (zinfo.CRC, zinfo.file_size)
+        if key in self._images:
+            digest = hashlib.sha1()
+            with source.zip.open(zinfo) as data:
+                for chunk in iter(lambda: data.read(64 * 1024), b''):
+                    digest.update(chunk)
+            relid = self._images[key].get(digest.hexdigest())
+            if relid is not None:
+                return relid
+        # Images go through a temporary file: the store hashes files, and
+        # they are only written into the package once the body is done
+        directory = os.path.join(self._tmpdir, str(self.sources))
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        path = os.path.join(directory, posixpath.basename(partname))
+        with source.zip.open(zinfo) as data:
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(data, f)
+        item = self.writer.media.add(path)
+        if item.path != os.path.abspath(path):
+            os.remove(path)
+        elif posixpath.splitext(partname)[1][1:].lower() not in DEFAULT_EXTENSIONS:
+            content_type = source.content_type(partname)
+            if content_type:
+                self.writer.content_types.types['/word/' + item.partname] = content_type
+        self._images.setdefault(key, {})[item.digest] = item.relid
+        return item.relid
+
+    def _styleid(self, source, styleid):
+        '''Return the output style id for a source's styleid'''
+        if styleid not in source.styleids:
+            style = source.styles.get(styleid)
+            # A cycle of basedOn links stops here
+            source.styleids[styleid] = styleid
+            if style is not None:
+                source.styleids[styleid] = self._styles.merge(style, lambda s: self._styleid(source, s))
+        return source.styleids[styleid]
+
+    def close(self):
+        '''Finish the output and remove the temporary files'''
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        finally:
+            if self._tmpdir is not None:
+                shutil.rmtree(self._tmpdir, ignore_errors=True)
+                self._tmpdir = None
+
+    def abort(self):
+        '''Stop merging after an error, discarding the output as
+        DocxWriter.abort() does, and remove the temporary files'''
+        try:
+            if self.writer is not None:
+                self.writer.abort()
+        finally:
+            if self._tmpdir is not None:
+                shutil.rmtree(self._tmpdir, ignore_errors=True)
+                self._tmpdir = None
+
+    def __enter__(self):
+        if self.template_file is not None:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def merge(sources, filename, template_file=None, compression=None):
+    '''Merge documents into one, see DocxMerger.
+
+    @param iterable sources: Paths of the documents, in order; any
+                             iterable, read one at a time
+    @param mixed filename: Path or writable file object of the output
+    @param string template_file: Package the output is based on, the first
+                                 source if omitted
+
+    @return int The number of documents merged
+    '''
+    with DocxMerger(filename, template_file=template_file, compression=compression) as merger:
+        for path in sources:
+            merger.add(path)
+    return merger.sources
@@ -1,11 +1,23 @@
+import re
 import time
 from lxml import etree
+from docx import NSPREFIXES
 from docx.utils import make_element
 
 class CoreProperties(object):
     """Core properties for a document.
     """
-    def __init__(self, title, creator, subject='', keywords=[], lastmodifiedby=None):
+    def __init__(self, title=None, creator=None, subject='', keywords=[], lastmodifiedby=None, xml=None):
+        if xml:
+            tree = etree.fromstring(xml)
+            def field(prefix, name):
+                element = tree.find('{%s}%s' % (NSPREFIXES[prefix], name))
+                return element.text or '' if element is not None else ''
+            title = field('dc', 'title')
+            creator = field('dc', 'creator')
+            subject = field('dc', 'subject')
+            keywords = [k for k in field('cp', 'keywords').split(',') if k]
+            lastmodifiedby = field('cp', 'lastModifiedBy')
         self.title = title
         self.creator = creator
         self.subject = subject
@@ -36,14 +48,21 @@ class CoreProperties(object):
 class AppProperties(object):
     """Properties describing the application which created the OpenXML file."""
 
-    def __init__(self, application='Microsoft Word 12.0.0', version='12.000'):
+    def __init__(self, application='Microsoft Word 12.0.0', version='12.000', xml=None):
+        if xml:
+            tree = etree.fromstring(xml)
+            for r in list(tree):
+                if r.tag == '{%s}Application' % NSPREFIXES['ep']:
+                    application = r.text
+                elif r.tag == '{%s}AppVersion' % NSPREFIXES['ep']:
+                    version = r.text
         self.application=application
         self.version=version
 
     def _xml(self):
         appprops = make_element('Properties',nsprefix='ep')
         appprops = etree.fromstring(
-        '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+        b'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
         <Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties" xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes"></Properties>''')
         props = {
                 'Template':'Normal.dotm',
@@ -67,7 +86,26 @@ class AppProperties(object):
         return appprops
 
 
+RELATIONSHIP_TYPES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+IMAGE_RELATIONSHIP = RELATIONSHIP_TYPES + 'image'
+HYPERLINK_RELATIONSHIP = RELATIONSHIP_TYPES + 'hyperlink'
+HEADER_RELATIONSHIP = RELATIONSHIP_TYPES + 'header'
+FOOTER_RELATIONSHIP = RELATIONSHIP_TYPES + 'footer'
+
+_NUMBERED_ID = re.compile(r'^rId([0-9]+)$')
+
+
 class WordRelationships(object):
+    '''The relationships of word/document.xml.
+
+    relationshiplist holds them as [Id, Type, Target] lists, with TargetMode
+    as a fourth item for external targets. They are indexed by id, by
+    target and by type; appending to the list directly is still picked up,
+    any other change to it needs a reindex().
+
+    New ids come from a counter above every rIdN loaded, so they never
+    collide with the template's, and are never handed out twice.
+    '''
 
     def __init__(self, xml=None):
         # Keeping track of which files have been added and copying them into the zipfile on saving.
@@ -75,7 +113,12 @@ class WordRelationships(object):
         self.to_copy = []
         if xml:
             tree = etree.fromstring(xml)
-            self.relationshiplist = [[r.get('Id'), r.get('Type'), r.get('Target')] for r in list(tree)]
+            self.relationshiplist = []
+            for r in list(tree):
+                relationship = [r.get('Id'), r.get('Type'), r.get('Target')]
+                if r.get('TargetMode'):
+                    relationship.append(r.get('TargetMode'))
+                self.relationshiplist.append(relationship)
         else:
             self.relationshiplist = [
             ['rId1', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering','numbering.xml'],
@@ -85,18 +128,105 @@ class WordRelationships(object):
             ['rId5', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/fontTable','fontTable.xml'],
             ['rId6', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/theme','theme/theme1.xml'],
         ]
+        self._next = 1
+        self.reindex()
+
+    def reindex(self):
+        '''Rebuild the indexes after changing relationshiplist in place'''
+        self._by_id = {}
+        self._by_target = {}
+        self._by_type = {}
+        self._indexed = 0
+        self._sync()
+
+    def _sync(self):
+        relationshiplist = self.relationshiplist
+        if len(relationshiplist) < self._indexed:
+            return self.reindex()
+        for relationship in relationshiplist[self._indexed:]:
+            relid, reltype, target = relationship[:3]
+            mode = relationship[3] if len(relationship) > 3 else None
+            self._by_id[relid] = relationship
+            self._by_target.setdefault((reltype, target, mode), relid)
+            self._by_type.setdefault(reltype, []).append(relationship)
+            match = _NUMBERED_ID.match(relid)
+            if match:
+                self._next = max(self._next, int(match.group(1)) + 1)
+        self._indexed = len(relationshiplist)
+
+    def __len__(self):
+        return len(self.relationshiplist)
+
+    def __iter__(self):
+        return iter(self.relationshiplist)
+
+    def next_id(self):
+        '''Allocate a new relationship id'''
+        self._sync()
+        while 'rId%d' % self._next in self._by_id:
+            self._next += 1
+        relid = 'rId%d' % self._next
+        self._next += 1
+        return relid
+
+    def get(self, relid):
+        '''Return the relationship with this id, or None'''
+        self._sync()
+        return self._by_id.get(relid)
+
+    def find(self, reltype, target, target_mode=None):
+        '''Return the id of the relationship to target, or None'''
+        self._sync()
+        return self._by_target.get((reltype, target, target_mode))
+
+    def of_type(self, reltype):
+        '''Return the relationships of a type, in order'''
+        self._sync()
+        return list(self._by_type.get(reltype, ()))
+
+    def add(self, reltype, target, target_mode=None, relid=None):
+        '''Add a relationship and return its id, allocated if not given'''
+        if relid is None:
+            relid = self.next_id()
+        elif self.get(relid) is not None:
+            raise ValueError('Relationship id %s is already used' % relid)
+        relationship = [relid, reltype, target]
+        if target_mode:
+            relationship.append(target_mode)
+        self.relationshiplist.append(relationship)
+        self._sync()
+        return relid
+
+    def get_or_add(self, reltype, target, target_mode=None):
+        '''Return the id of the relationship to target, adding it if needed'''
+        relid = self.find(reltype, target, target_mode)
+        if relid is None:
+            relid = self.add(reltype, target, target_mode)
+        return relid
+
+    def add_many(self, relationships):
+        '''Add (type, target) or (type, target, target_mode) tuples, such as
+        many images, headers or links at once. Return their ids in order;
+        targets already present keep their id.'''
+        return [self.get_or_add(*relationship) for relationship in relationships]
+
+    def add_hyperlink(self, url):
+        '''Return the id of an external hyperlink relationship to url'''
+        return self.get_or_add(HYPERLINK_RELATIONSHIP, url, 'External')
 
     def _xml(self):
         '''Generate a Word relationships file'''
         # FIXME: using string hack instead of making element
         relationships = etree.fromstring(
-        '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+        b'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
         <Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
             </Relationships>'''
         )
         for relationship in self.relationshiplist:
-            relationships.append(make_element('Relationship',attributes={'Id': relationship[0],
-            'Type':relationship[1],'Target':relationship[2]},nsprefix=None))
+            attributes = {'Id': relationship[0], 'Type':relationship[1], 'Target':relationship[2]}
+            if len(relationship) > 3 and relationship[3]:
+                attributes['TargetMode'] = relationship[3]
+            relationships.append(make_element('Relationship',attributes=attributes,nsprefix=None))
         return relationships
 
 
@@ -104,12 +234,16 @@ class ContentTypes(object):
     # FIXME - doesn't quite work...read from string as temp hack...
     #types = make_element('Types',nsprefix='ct')
     def __init__(self, xml=None):
+        # Content types by file extension, as the template declares them
+        self.defaults = {}
         if xml:
             self.types = dict()
             tree = etree.fromstring(xml)
             for r in list(tree):
                 if 'Override' in r.tag:
                     self.types[r.get('PartName')] = r.get('ContentType')
+                elif 'Default' in r.tag:
+                    self.defaults[r.get('Extension')] = r.get('ContentType')
         else:
             self.types = {
                 '/word/theme/theme1.xml':'application/vnd.openxmlformats-officedocument.theme+xml',
@@ -124,13 +258,13 @@ class ContentTypes(object):
                 }
 
     def _xml(self):
-        content_types = etree.fromstring('''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+        content_types = etree.fromstring(b'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
         <Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"></Types>''')
         for t in self.types:
             content_types.append(
                 make_element('Override',nsprefix=None,attributes={'PartName':t,'ContentType':self.types[t]})
             )
-        # Add support for filetypes
+        # Add support for filetypes, and keep those of the template
         filetypes = {
             'rels':'application/vnd.openxmlformats-package.relationships+xml',
             'xml':'application/xml',
@@ -139,7 +273,8 @@ class ContentTypes(object):
             'png':'image/png',
             'wmf': 'image/x-wmf',
         }
-        for extension in filetypes:
+        filetypes.update(self.defaults)
+        for extension in sorted(filetypes):
             content_types.append(
                 make_element(
                     'Default',
@@ -0,0 +1,133 @@
+import collections
+import contextlib
+import time
+
+
+class Stat(object):
+    '''Time and bytes spent on a phase or a package part.
+
+    For a saved part bytes_in is its uncompressed size and bytes_out what
+    was written into the package; for a loaded part bytes_in is the size
+    stored in the template and bytes_out the size once read. A phase sums
+    the parts saved while it ran, and the parse phase the parts it read.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def ratio(self):
+        '''bytes_out / bytes_in, or None when nothing went in'''
+        if not self.bytes_in:
+            return None
+        return self.bytes_out / float(self.bytes_in)
+
+    def as_dict(self):
+        return {'name': self.name, 'calls': self.calls, 'seconds': self.seconds,
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out, 'ratio': self.ratio}
+
+    def __repr__(self):
+        return '<Stat %s: %d calls, %.6fs, %d -> %d bytes>' % (
+            self.name, self.calls, self.seconds, self.bytes_in, self.bytes_out)
+
+
+class DocxStats(object):
+    '''Timings and sizes collected by a DocxDocument.
+
+    Phases (load, parse, save and its steps, replace...) add up over the
+    life of the document. saved_parts and loaded_parts hold one Stat per
+    package part, the last time it was written or read.
+
+    Hooks are called as hook(kind, stat) whenever a phase ends (kind
+    'phase') or a part has been saved or loaded (kind 'save' or 'load'),
+    which is enough to feed any metrics system.
+
+    example
+    def send(kind, stat):
+        metrics.timing('docx.%s.%s' % (kind, stat.name), stat.seconds)
+    document.stats.add_hook(send)
+    '''
+
+    def __init__(self):
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        '''Forget everything recorded so far, but keep the hooks'''
+        self.phases = collections.OrderedDict()
+        self.saved_parts = collections.OrderedDict()
+        self.loaded_parts = collections.OrderedDict()
+        self._active = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _emit(self, kind, stat):
+        for hook in self.hooks:
+            hook(kind, stat)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Time the enclosed block as one call of the phase name'''
+        stat = self.phases.get(name)
+        if stat is None:
+            stat = self.phases[name] = Stat(name)
+        self._active.append(stat)
+        start = time.time()
+        try:
+            yield stat
+        finally:
+            stat.seconds += time.time() - start
+            stat.calls += 1
+            self._active.remove(stat)
+            self._emit('phase', stat)
+
+    def part(self, kind, name, seconds, bytes_in, bytes_out):
+        '''Record a part saved or loaded (kind 'save' or 'load')'''
+        parts = self.saved_parts if kind == 'save' else self.loaded_parts
+        stat = parts[name] = Stat(name)
+        stat.calls = 1
+        stat.seconds = seconds
+        stat.bytes_in = bytes_in
+        stat.bytes_out = bytes_out
+        # Parts read on first access must not count towards whatever
+        # phase happened to trigger the parsing
+        for active in self._active if kind == 'save' else self._active[-1:]:
+            active.bytes_in += bytes_in
+            active.bytes_out += bytes_out
+        self._emit(kind, stat)
+        return stat
+
+    @contextlib.contextmanager
+    def writing(self, zip_file):
+        '''Record the parts added to zip_file by the enclosed block. Blocks
+        writing several parts share their time out evenly.'''
+        first = len(zip_file.filelist)
+        start = time.time()
+        yield
+        written = zip_file.filelist[first:]
+        if written:
+            seconds = (time.time() - start) / len(written)
+            for zinfo in written:
+                self.part('save', zinfo.filename, seconds, zinfo.file_size, zinfo.compress_size)
+
+    def summary(self):
+        '''Return the phases and parts as a printable table'''
+        lines = ['%-36s %6s %10s %12s %12s %6s' % ('', 'calls', 'seconds', 'bytes in', 'bytes out', 'ratio')]
+        for title, stats in (('phases', self.phases), ('saved parts', self.saved_parts),
+                             ('loaded parts', self.loaded_parts)):
+            if not stats:
+                continue
+            lines.append(title)
+            for stat in stats.values():
+                ratio = stat.ratio
+                lines.append('  %-34s %6d %10.4f %12d %12d %6s' % (
+                    stat.name, stat.calls, stat.seconds, stat.bytes_in, stat.bytes_out,
+                    '%.2f' % ratio if ratio is not None else '-'))
+        return '\n'.join(lines)
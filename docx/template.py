@@ -0,0 +1,176 @@
+import copy
+import io
+import os
+import re
+import sys
+import zipfile
+import zlib
+
+from lxml import etree
+
+from docx import NSPREFIXES
+from docx.compression import compression_policy
+from docx.document import DocxDocument, REWRITTEN_PARTS
+from docx.index import TextIndex, _replace_in_runs
+from docx.meta import WordRelationships, ContentTypes
+from docx.utils import read_raw_member, write_raw_member, write_member, xml_text
+
+# {{name}}, the name being the first group
+PLACEHOLDER = r'\{\{\s*([\w.-]+)\s*\}\}'
+
+# Placeholders are marked by these private use characters in the text
+# while the template is serialized, then cut out of the bytes
+_OPEN, _CLOSE = u'\ue000', u'\ue001'
+_SLOT = re.compile(_OPEN + u'(.*?)' + _CLOSE, re.S)
+_SLOT_BYTES = re.compile(_OPEN.encode('utf-8') + b'([0-9]+)' + _CLOSE.encode('utf-8'))
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+class CompiledTemplate(object):
+    '''A .docx template read and parsed once, then rendered many times.
+
+    The document, its relationships and content types are parsed up front.
+    Every part is also kept exactly as stored in the template, still
+    compressed, and copied verbatim into each saved render unless the
+    render changed it. The relationships and content types only count as
+    changed once a render accesses them.
+
+    example
+    template = CompiledTemplate('letter.docx')
+    for customer in customers:
+        document = template.render()
+        document.replace_many({'{{name}}': customer.name})
+        document.save(customer.filename)
+    '''
+
+    def __init__(self, template_file):
+        self.template_file = template_file
+        template_zip = zipfile.ZipFile(template_file, 'r')
+        try:
+            self.document = etree.fromstring(template_zip.read('word/document.xml'))
+            self.word_relationships = WordRelationships(xml=template_zip.read('word/_rels/document.xml.rels'))
+            self.content_types = ContentTypes(xml=template_zip.read('[Content_Types].xml'))
+            self.names = template_zip.namelist()
+            # (ZipInfo, compressed bytes) of the parts copied as they are;
+            # those rewritten by a render are only copied when unchanged
+            self.members = []
+            self._members = {}
+            for zinfo in template_zip.infolist():
+                member = (zinfo, read_raw_member(template_zip, zinfo))
+                self._members[zinfo.filename] = member
+                if os.path.basename(zinfo.filename) not in REWRITTEN_PARTS:
+                    self.members.append(member)
+        finally:
+            template_zip.close()
+
+    def render(self):
+        '''Return a new DocxDocument holding its own copy of the template'''
+        return DocxDocument(compiled_template=self)
+
+    def part_names(self):
+        '''Return the names of the parts in the template package'''
+        return list(self.names)
+
+    def getinfo(self, partname):
+        '''Return the ZipInfo of a part copied as it is'''
+        return self._members[partname][0]
+
+    def read(self, partname):
+        '''Return the uncompressed content of a part copied as it is'''
+        zinfo, data = self._members[partname]
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        return data
+
+    def copy_member(self, partname, zip_file):
+        '''Write a part copied as it is into zip_file'''
+        zinfo, data = self._members[partname]
+        write_raw_member(zip_file, zinfo, data)
+
+
+class PlaceholderTemplate(object):
+    '''Fast renderer for templates whose only change is placeholder text.
+
+    word/document.xml is serialized once and cut into byte chunks around
+    every placeholder, including placeholders split over several runs of
+    a paragraph. A render escapes the values and joins them with the
+    chunks; no tree is parsed, copied or serialized. Every other part is
+    copied as stored, like CompiledTemplate does.
+
+    @param mixed template: Path of the .docx template or a CompiledTemplate
+    @param str   pattern: Regex of a placeholder; its first group, or the
+                          whole match if it has none, is the value's name
+
+    example
+    template = PlaceholderTemplate('letter.docx')
+    for customer in customers:
+        template.render({'name': customer.name}, customer.filename)
+    '''
+
+    def __init__(self, template, pattern=PLACEHOLDER):
+        if not isinstance(template, CompiledTemplate):
+            template = CompiledTemplate(template)
+        self.template = template
+        self.pattern = re.compile(pattern)
+        # (name, serialized placeholder text) of each slot
+        self.slots = []
+        self.chunks = self._split(copy.deepcopy(template.document))
+        self.names = set(name for name, original in self.slots)
+
+    def _split(self, document):
+        # Gather each placeholder into the first text element it starts in,
+        # between markers
+        marked = _OPEN + u'\\g<0>' + _CLOSE
+        for paragraph, textels in TextIndex(document).runs():
+            _replace_in_runs(textels, self.pattern, marked, sys.maxsize)
+        for el in document.iter('{%s}t' % NSPREFIXES['w']):
+            if el.text and _OPEN in el.text:
+                el.text = _SLOT.sub(self._slot, el.text)
+                # Values may start or end with spaces
+                el.set(_XML_SPACE, 'preserve')
+        xml = etree.tostring(document, pretty_print=True, xml_declaration=True, encoding='utf-8')
+        return _SLOT_BYTES.split(xml)[::2]
+
+    def _slot(self, match):
+        original = match.group(1)
+        found = self.pattern.match(original)
+        name = found.group(1) if found.re.groups else found.group(0)
+        self.slots.append((name, xml_text(original)))
+        return u'%s%d%s' % (_OPEN, len(self.slots) - 1, _CLOSE)
+
+    def render_xml(self, values):
+        '''Return word/document.xml with the placeholders replaced by
+        values[name]. Placeholders without a value are left as they are.'''
+        # Each value is escaped once, however many slots it fills
+        escaped = {}
+        for name in self.names:
+            value = values.get(name)
+            if value is not None:
+                escaped[name] = xml_text(value)
+        parts = [None] * (2 * len(self.slots) + 1)
+        parts[::2] = self.chunks
+        parts[1::2] = [escaped.get(name, original) for name, original in self.slots]
+        return b''.join(parts)
+
+    def render(self, values, filename=None, compression=None):
+        '''Write a document with the placeholders replaced by values[name].
+
+        filename is a path or a writable binary file object; without one
+        the document is returned as bytes. compression applies to
+        word/document.xml, see DocxDocument.save(); the other parts are
+        copied as stored.'''
+        output = io.BytesIO() if filename is None else filename
+        xml = self.render_xml(values)
+        zip_file = zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED)
+        try:
+            for zinfo, data in self.template.members:
+                write_raw_member(zip_file, zinfo, data)
+            # Placeholders change neither relationships nor content types
+            for partname in ('word/_rels/document.xml.rels', '[Content_Types].xml'):
+                self.template.copy_member(partname, zip_file)
+            write_member(zip_file, 'word/document.xml', xml,
+                         *compression_policy(compression).compression('word/document.xml'))
+        finally:
+            zip_file.close()
+        if filename is None:
+            return output.getvalue()
@@ -1,37 +1,475 @@
+import re
+import struct
+import time
+import zipfile
+import zlib
+
+try:
+    unichr, unicode = unichr, unicode
+except NameError:
+    unichr, unicode = chr, str
+
 from lxml import etree
 from docx import NSPREFIXES
 
 
+# Characters lxml refuses in text, which must not reach raw XML bytes either
+_INVALID_XML_CHARS = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xml_text(value):
+    '''Return value as escaped UTF-8 bytes for an XML text node, for
+    splicing into serialized XML. Byte strings are taken as UTF-8.'''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    elif not isinstance(value, unicode):
+        value = unicode(value)
+    if _INVALID_XML_CHARS.search(value):
+        raise ValueError('All strings must be XML compatible')
+    # Same as xml.sax.saxutils.escape, which is slow to import though
+    return value.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;').encode('utf-8')
+
+
+# Namespace declarations in a start tag
+_XMLNS_DECLARATION = re.compile(br' xmlns(?::([\w.-]+))?="([^"]*)"')
+
+
+def serialize_child(element, nsmap, pretty_print=True):
+    '''Return element as UTF-8 bytes to be written inside a parent that
+    declares the namespaces of nsmap, such as the body of document.xml
+    being streamed. lxml declares every namespace in scope on the element
+    it serializes; the declarations the parent makes already are left out.'''
+    xml = etree.tostring(element, encoding='utf-8', pretty_print=pretty_print)
+    if callable(element.tag):
+        # Comments and processing instructions declare nothing
+        return xml
+    end = xml.index(b'>')
+
+    def declaration(match):
+        prefix = match.group(1)
+        if prefix is not None:
+            prefix = prefix.decode('utf-8')
+        if nsmap.get(prefix) == match.group(2).decode('utf-8'):
+            return b''
+        return match.group(0)
+    return _XMLNS_DECLARATION.sub(declaration, xml[:end]) + xml[end:]
+
+
+# '{namespace}' strings to prefix tag and attribute names with, by nsprefix
+_namespaces = dict((prefix, '{'+NSPREFIXES[prefix]+'}') for prefix in NSPREFIXES)
+_namespaces[None] = _namespaces[''] = ''
+
+
+def qname(name, nsprefix='w'):
+    '''Return the {namespace}name form lxml uses for a tag or attribute'''
+    return _namespaces[nsprefix]+name
+
+
+def _set_attributes(element, attributes, nsprefix, attrnsprefix):
+    # If they haven't bothered setting attribute namespace, use an empty string
+    # (equivalent of no namespace)
+    if not attrnsprefix:
+        # Quick hack: it seems every element that has a 'w' nsprefix for its tag uses the same prefix for it's attributes  
+        attributenamespace = _namespaces['w'] if nsprefix == 'w' else ''
+    else:
+        attributenamespace = _namespaces[attrnsprefix]
+    for tagattribute in attributes:
+        element.set(attributenamespace+tagattribute, attributes[tagattribute])
+
+
 def make_element(tagname, tagtext=None, nsprefix='w', attributes=None, attrnsprefix=None):
     '''Create an element & return it''' 
     # Deal with list of nsprefix by making namespacemap
-    namespacemap = None
     if type(nsprefix) == list:
         namespacemap = {}
         for prefix in nsprefix:
             namespacemap[prefix] = NSPREFIXES[prefix]
         nsprefix = nsprefix[0] # FIXME: rest of code below expects a single prefix
-    if nsprefix:
-        namespace = '{'+NSPREFIXES[nsprefix]+'}'
+        newelement = etree.Element(_namespaces[nsprefix]+tagname, nsmap=namespacemap)
     else:
-        # For when namespace = None
-        namespace = ''
-    newelement = etree.Element(namespace+tagname, nsmap=namespacemap)
+        newelement = etree.Element(_namespaces[nsprefix]+tagname)
     # Add attributes with namespaces
     if attributes:
-        # If they haven't bothered setting attribute namespace, use an empty string
-        # (equivalent of no namespace)
-        if not attrnsprefix:
-            # Quick hack: it seems every element that has a 'w' nsprefix for its tag uses the same prefix for it's attributes  
-            if nsprefix == 'w':
-                attributenamespace = namespace
-            else:
-                attributenamespace = ''
-        else:
-            attributenamespace = '{'+NSPREFIXES[attrnsprefix]+'}'
-                    
-        for tagattribute in attributes:
-            newelement.set(attributenamespace+tagattribute, attributes[tagattribute])
+        _set_attributes(newelement, attributes, nsprefix, attrnsprefix)
     if tagtext:
         newelement.text = tagtext    
     return newelement
+
+
+def sub_element(parent, tagname, tagtext=None, nsprefix='w', attributes=None, attrnsprefix=None):
+    '''Create an element as the last child of parent & return it. Same
+    arguments as make_element(), but it is cheaper than appending one.'''
+    newelement = etree.SubElement(parent, _namespaces[nsprefix]+tagname)
+    if attributes:
+        _set_attributes(newelement, attributes, nsprefix, attrnsprefix)
+    if tagtext:
+        newelement.text = tagtext
+    return newelement
+
+
+class ElementCache(object):
+    '''Prebuilt subtrees, such as run or cell properties, handed out as
+    copies. build(*key) makes the subtree for a key the first time it is
+    asked for; copying it afterwards is much cheaper than building it.'''
+
+    def __init__(self, build, maxsize=256):
+        self.build = build
+        self.maxsize = maxsize
+        self._elements = {}
+
+    def get(self, *key):
+        try:
+            element = self._elements[key]
+        except KeyError:
+            if len(self._elements) >= self.maxsize:
+                self._elements.clear()
+            element = self._elements[key] = self.build(*key)
+        # lxml copies the whole subtree
+        return element.__copy__()
+
+
+class lazyproperty(object):
+    '''Attribute computed by the decorated method on first access and then
+    stored on the instance. Assigning the attribute skips the method.'''
+
+    def __init__(self, method):
+        self.method = method
+        self.__name__ = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.__name__] = self.method(instance)
+        return value
+
+
+# Characters with a meaning in a regex, outside of a character class
+_REGEX_SPECIALS = frozenset('.^$*+?{}[]|()')
+# Flags a pattern gets without any asked for: re.UNICODE for text on py3
+_DEFAULT_FLAGS = re.compile(u'').flags
+# A backreference, which would point at another group in an alternation
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def _compile(search):
+    '''Compile a search regex, unless it is compiled already'''
+    if hasattr(search, 'pattern') and hasattr(search, 'flags'):
+        return search
+    return re.compile(search)
+
+
+def _literal(pattern):
+    '''Return the text a compiled regex matches if it is a plain literal,
+    such as 'Regards' or 'Mr\\.', else None'''
+    if pattern.flags & ~_DEFAULT_FLAGS:
+        return None
+    chars = []
+    escaped = False
+    for char in pattern.pattern:
+        if escaped:
+            # \d, \n, \1 and the like do not stand for the character
+            if char.isalnum() or char == '_':
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in _REGEX_SPECIALS:
+            return None
+        else:
+            chars.append(char)
+    literal = u''.join(chars)
+    # The regex has to match exactly that text
+    match = pattern.match(literal)
+    if escaped or match is None or match.end() != len(literal):
+        return None
+    return literal
+
+
+def _search(pattern, text, pos):
+    '''Return the first non-empty match of pattern in text from pos'''
+    match = pattern.search(text, pos)
+    while match is not None and match.start() == match.end():
+        if match.end() >= len(text):
+            return None
+        match = pattern.search(text, match.end() + 1)
+    return match
+
+
+class MultiPattern(object):
+    '''Several search regexes merged into one alternation, so a text is
+    scanned once whatever the number of patterns.
+
+    pairs is a list of (search, replace) pairs, each search a regex or a
+    compiled pattern. A match is attributed to the first pattern, in list
+    order, that matches at its position, which is what the alternation
+    itself does. Patterns made of plain text only are dispatched with a
+    dict lookup; the others are re-matched one by one.
+
+    A single pattern, or patterns that can not share an alternation
+    because of their flags, backreferences or group names, are searched
+    for each on its own instead, with the same results.
+    '''
+
+    def __init__(self, pairs):
+        self.patterns = []
+        self.replacements = []
+        literals = {}
+        for search, replace in pairs:
+            pattern = _compile(search)
+            literal = _literal(pattern)
+            if literal is not None:
+                literals.setdefault(literal, len(self.patterns))
+            self.patterns.append(pattern)
+            self.replacements.append(replace)
+        self.literals = literals if len(literals) == len(self.patterns) else None
+        self.regex = self._alternation()
+
+    def _alternation(self):
+        if len(self.patterns) < 2:
+            return None
+        for pattern in self.patterns:
+            if pattern.flags & ~_DEFAULT_FLAGS or _BACKREFERENCE.search(pattern.pattern):
+                return None
+        try:
+            return re.compile('|'.join('(?:%s)' % p.pattern for p in self.patterns))
+        except re.error:
+            return None
+
+    def finditer(self, text):
+        '''Yield (index, match) for every non-empty match in text, where
+        match comes from the pattern at index so its groups are usable.'''
+        if self.regex is None:
+            for found in self._scan(text):
+                yield found
+            return
+        for match in self.regex.finditer(text):
+            if match.start() == match.end():
+                continue
+            if self.literals is not None:
+                yield self.literals[match.group()], match
+                continue
+            for index, pattern in enumerate(self.patterns):
+                own = pattern.match(text, match.start())
+                if own is not None:
+                    yield index, own
+                    break
+
+    def _scan(self, text):
+        # The leftmost match of any pattern, the first one winning a tie,
+        # then the next one from its end on, as an alternation would do.
+        # found holds the next match of each pattern, None once there are
+        # no more, False when it has to be searched for.
+        found = [False] * len(self.patterns)
+        pos = 0
+        while True:
+            best = None
+            for index, pattern in enumerate(self.patterns):
+                match = found[index]
+                if match is False or (match is not None and match.start() < pos):
+                    match = found[index] = _search(pattern, text, pos)
+                if match is not None and (best is None or match.start() < best[1].start()):
+                    best = index, match
+            if best is None:
+                return
+            yield best
+            pos = best[1].end()
+
+    def expand(self, index, match):
+        '''Return the replacement text of a match found by finditer()'''
+        replace = self.replacements[index]
+        if '\\' not in replace:
+            return replace
+        return match.expand(replace)
+
+
+def _start_member(zip_file, zinfo):
+    '''Write the local header of a new member, return nothing'''
+    if not zip_file.fp:
+        raise RuntimeError('Attempt to write to ZIP archive that was already closed')
+    if hasattr(zip_file, 'start_dir') and getattr(zip_file, '_seekable', True):
+        zip_file.fp.seek(zip_file.start_dir)
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+    zip_file.fp.write(zinfo.FileHeader(False))
+
+
+def _end_member(zip_file, zinfo):
+    '''Register a member whose data has been written'''
+    if zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile('Filesize would require ZIP64 extensions')
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+    if hasattr(zip_file, 'start_dir'):
+        zip_file.start_dir = zip_file.fp.tell()
+
+
+def _seek_member_data(zip_file, zinfo):
+    '''Position the archive file at the start of a member's stored data'''
+    if zinfo.flag_bits & 0x01:
+        raise RuntimeError('%s is encrypted' % zinfo.filename)
+    fp = zip_file.fp
+    fp.seek(zinfo.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, fp.read(zipfile.sizeFileHeader))
+    if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipfile('Bad magic number for file header')
+    fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+    return fp
+
+
+def _raw_info(zinfo, compress_size):
+    '''Return a fresh ZipInfo describing the same stored data as zinfo'''
+    newinfo = zipfile.ZipInfo(zinfo.filename, date_time=zinfo.date_time)
+    newinfo.compress_type = zinfo.compress_type
+    newinfo.external_attr = zinfo.external_attr
+    newinfo.create_system = zinfo.create_system
+    newinfo.CRC = zinfo.CRC
+    newinfo.file_size = zinfo.file_size
+    newinfo.compress_size = compress_size
+    return newinfo
+
+
+def read_raw_member(zip_file, zinfo):
+    '''Return the data of a member as stored in the archive, still compressed'''
+    return _seek_member_data(zip_file, zinfo).read(zinfo.compress_size)
+
+
+def write_raw_member(zip_file, zinfo, data):
+    '''Add a member from data read with read_raw_member(), so it is copied
+    without being inflated and deflated again. zinfo is the member's info in
+    the archive it came from.'''
+    newinfo = _raw_info(zinfo, len(data))
+    _start_member(zip_file, newinfo)
+    zip_file.fp.write(data)
+    _end_member(zip_file, newinfo)
+
+
+def write_member(zip_file, arcname, data, compress_type=None, level=None):
+    '''Add a member holding data, like ZipFile.writestr() but deflated at
+    the given zlib level'''
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = zip_file.compression if compress_type is None else compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data) & 0xffffffff
+    if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    zinfo.compress_size = len(data)
+    _start_member(zip_file, zinfo)
+    zip_file.fp.write(data)
+    _end_member(zip_file, zinfo)
+
+
+def copy_raw_member(source_zip, zinfo, zip_file, chunk_size=64 * 1024):
+    '''Copy a member of source_zip into zip_file as stored, compressed data
+    and CRC included, in chunks of chunk_size bytes.'''
+    newinfo = _raw_info(zinfo, zinfo.compress_size)
+    _start_member(zip_file, newinfo)
+    fp = _seek_member_data(source_zip, zinfo)
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise zipfile.BadZipfile('Truncated member %s' % zinfo.filename)
+        remaining -= len(chunk)
+        zip_file.fp.write(chunk)
+    _end_member(zip_file, newinfo)
+
+
+class ZipMemberWriter(object):
+    '''Write-only file object streaming data into a new member of an open
+    zip file. Data is compressed as it arrives and the sizes and CRC go into
+    a data descriptor after the member, so the whole part never has to be
+    held in memory. Nothing else may be written to the zip file until the
+    member is closed. level is the zlib level data is deflated at.'''
+
+    def __init__(self, zip_file, arcname, compress_type=None, level=None):
+        self.zip_file = zip_file
+        self.zinfo = zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = zip_file.compression if compress_type is None else compress_type
+        zinfo.external_attr = 0o600 << 16
+        # Sizes and CRC follow the data
+        zinfo.flag_bits |= 0x08
+        zinfo.file_size = zinfo.compress_size = zinfo.CRC = 0
+        _start_member(zip_file, zinfo)
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+                                                zlib.DEFLATED, -15)
+        else:
+            self._compressor = None
+        self.closed = False
+
+    def write(self, data):
+        if not data:
+            return
+        zinfo = self.zinfo
+        zinfo.file_size += len(data)
+        zinfo.CRC = zlib.crc32(data, zinfo.CRC) & 0xffffffff
+        if self._compressor:
+            data = self._compressor.compress(data)
+        zinfo.compress_size += len(data)
+        self.zip_file.fp.write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        zinfo = self.zinfo
+        if self._compressor:
+            tail = self._compressor.flush()
+            zinfo.compress_size += len(tail)
+            self.zip_file.fp.write(tail)
+        self.zip_file.fp.write(struct.pack('<LLLL', 0x08074b50, zinfo.CRC,
+                                           zinfo.compress_size, zinfo.file_size))
+        _end_member(self.zip_file, zinfo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_file_member(zip_file, path, arcname, compress_type=None, level=None, chunk_size=64 * 1024):
+    '''Add the file at path as arcname. Unlike ZipFile.write() this never
+    seeks back in the archive, so it works on any output stream.'''
+    with open(path, 'rb') as f:
+        with ZipMemberWriter(zip_file, arcname, compress_type, level) as member:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                member.write(chunk)
+
+
+class ChunkedOutput(object):
+    '''Write-only, non seekable file object collecting what is written to
+    it until drain() hands it over. A zip file written to it can be sent
+    piece by piece while it is being built.'''
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.size = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(data)
+            self._position += len(data)
+            self.size += len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        '''Return everything written since the last call'''
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
@@ -0,0 +1,231 @@
+import os
+import time
+import zipfile
+
+try:
+    from itertools import izip
+except ImportError:
+    izip = zip
+
+from lxml import etree
+
+from docx import NSPREFIXES
+from docx.compression import compression_policy
+from docx.document import DocxDocument
+from docx.elements import table, _text_cell_cache, _cell_align
+from docx.utils import ZipMemberWriter, xml_text, serialize_child
+
+class _RowTemplate(object):
+    '''A table row of plain text cells, serialized once and split around
+    the cell texts so each row is rendered by joining byte strings.'''
+
+    def __init__(self, widths, celstyle, nsmap):
+        # Serialized inside a wrapper declaring the document namespaces, the
+        # row comes out with the document's prefixes and no declarations.
+        wrapper = etree.Element('{%s}body' % NSPREFIXES['w'], nsmap=nsmap)
+        row = etree.SubElement(wrapper, '{%s}tr' % NSPREFIXES['w'])
+        for i, (width, unit) in enumerate(widths):
+            cell = _text_cell_cache.get(width, unit, False, _cell_align(celstyle, i))
+            cell[1][-1][-1].text = u'\ue000'
+            row.append(cell)
+        xml = etree.tostring(wrapper, encoding='utf-8')
+        xml = xml[xml.index(b'>') + 1:xml.rindex(b'</')]
+        self.chunks = xml.split(u'\ue000'.encode('utf-8'))
+
+    def render(self, values):
+        if len(values) != len(self.chunks) - 1:
+            raise ValueError('Expected %d cells, got %d' % (len(self.chunks) - 1, len(values)))
+        parts = [self.chunks[0]]
+        for value, chunk in izip(values, self.chunks[1:]):
+            # An empty cell for None, as table() leaves it
+            if value is not None:
+                parts.append(xml_text(value))
+            parts.append(chunk)
+        return b''.join(parts)
+
+
+class DocxWriter(object):
+    '''Append-only writer for documents too large to keep in memory.
+
+    Elements made by paragraph(), table(), heading(), pagebreak() and
+    picture() are serialized into word/document.xml as soon as they are
+    added, so memory use does not grow with the document. The writer can be
+    passed to picture() in place of a DocxDocument. filename can also be a
+    writable binary file object, which does not need to be seekable.
+    compression is a policy or preset name, as for DocxDocument.save().
+
+    example
+    with DocxWriter('report.docx', template_file='template.docx') as writer:
+        writer.add(heading('Report', 1))
+        for row in rows:
+            writer.add(paragraph(row))
+    '''
+
+    def __init__(self, filename, template_file=None, template_dir=None, compression=None):
+        self.filename = filename
+        self.template = DocxDocument(template_file=template_file, template_dir=template_dir)
+        self.template._compression = compression_policy(compression)
+        self.zip_file = None
+
+    @property
+    def word_relationships(self):
+        return self.template.word_relationships
+
+    @property
+    def stats(self):
+        return self.template.stats
+
+    @property
+    def media(self):
+        return self.template.media
+
+    @property
+    def content_types(self):
+        return self.template.content_types
+
+    def open(self):
+        '''Write the template parts and start the document body.'''
+        template = self.template
+        self.zip_file = template.zip_file = zipfile.ZipFile(self.filename, mode='w', compression=zipfile.ZIP_DEFLATED)
+        self._opened = time.time()
+        with self.stats.phase('template_parts'):
+            template._write_template_parts()
+
+        self._member = ZipMemberWriter(self.zip_file, 'word/document.xml',
+                                       *template._compression.compression('word/document.xml'))
+        self._xmlfile = etree.xmlfile(self._member, encoding='utf-8')
+        self._xf = self._xmlfile.__enter__()
+        self._xf.write_declaration(standalone=True)
+        self._contexts = []
+        self._enter(template.document.tag, template.document.attrib, template.document.nsmap)
+        for child in template.document:
+            if child.tag != template.body.tag:
+                self._write(child)
+        self._enter(template.body.tag, template.body.attrib)
+        # Anything already in the template body comes first; the final
+        # section properties have to stay the last child of the body.
+        self._sectpr = None
+        for child in template.body:
+            if child.tag == '{%s}sectPr' % NSPREFIXES['w']:
+                self._sectpr = child
+            else:
+                self._write(child)
+        return self
+
+    def _enter(self, tag, attrib, nsmap=None):
+        context = self._xf.element(tag, dict(attrib), nsmap=nsmap)
+        context.__enter__()
+        self._contexts.append(context)
+        # Elements are written to the member directly, after the start tag
+        self._xf.flush()
+
+    def _write(self, element):
+        # Attached to a parent declaring the document namespaces, the element
+        # is serialized with the document's prefixes. Taking a large element
+        # out again is slow in lxml, so the parent is just dropped instead.
+        nsmap = self.template.document.nsmap
+        if element.getroottree().getroot() is not self.template.document:
+            etree.Element(self.template.body.tag, nsmap=nsmap).append(element)
+        self._member.write(serialize_child(element, nsmap))
+
+    def add(self, element):
+        '''Serialize an element at the end of the body and let it go.'''
+        if self.zip_file is None:
+            raise RuntimeError('DocxWriter is not open')
+        self._write(element)
+
+    def add_xml(self, fragment):
+        '''Write pre-serialized XML at the end of the body, as is. The
+        fragment must be well formed and use the namespace prefixes declared
+        on the template's document element, such as w:.'''
+        if self.zip_file is None:
+            raise RuntimeError('DocxWriter is not open')
+        self._xf.flush()
+        self._member.write(fragment)
+
+    def add_block(self, block):
+        '''Write a docx.blocks.Block at the end of the body, serialized
+        once for all its uses.'''
+        self.add_xml(self.template.block_cache.get(block, self.template.document.nsmap))
+
+    def add_table(self, rows=None, columns=None, heading=True, colw=None, cwunit='dxa', tblw=0, twunit='auto', borders={}, celstyle=None):
+        '''Stream a table of any length into the body without building it.
+
+        Takes either rows, an iterable of rows, or columns, a list of column
+        iterables, which are consumed in step. The other arguments are those
+        of table(). Rows whose cells are all plain values are rendered from a
+        row serialized once; rows holding elements or lists go through
+        table() one at a time.'''
+        if columns is not None:
+            rows = izip(*columns)
+        rows = iter(rows)
+        try:
+            first = list(next(rows))
+        except StopIteration:
+            return
+        # The table properties, grid and first row come from table() itself
+        head = table([first], heading=heading, colw=colw, cwunit=cwunit, tblw=tblw,
+                     twunit=twunit, borders=borders, celstyle=celstyle)
+        if colw:
+            widths = [(str(w), cwunit) for w in colw]
+        else:
+            widths = [('0', 'auto')] * len(first)
+        template = _RowTemplate(widths, celstyle, self.template.document.nsmap)
+        with self._xf.element(head.tag, dict(head.attrib)):
+            self._xf.flush()
+            for child in list(head):
+                self._write(child)
+            for row in rows:
+                if any(isinstance(value, (list, tuple, etree._Element)) for value in row):
+                    self._write(table([list(row)], heading=False, colw=colw, cwunit=cwunit, celstyle=celstyle)[-1])
+                else:
+                    self._member.write(template.render(row))
+        # The end tag, before anything else is written
+        self._xf.flush()
+
+    def close(self):
+        '''Finish document.xml and write the remaining package parts. If
+        that fails, the output is discarded as by abort().'''
+        if self.zip_file is None:
+            return
+        closed = False
+        try:
+            if self._sectpr is not None:
+                self._write(self._sectpr)
+            while self._contexts:
+                self._contexts.pop().__exit__(None, None, None)
+            self._xmlfile.__exit__(None, None, None)
+            self._member.close()
+            zinfo = self._member.zinfo
+            self.stats.part('save', zinfo.filename, time.time() - self._opened, zinfo.file_size, zinfo.compress_size)
+            with self.stats.phase('package_parts'):
+                self.template._write_package_parts()
+            self.zip_file.close()
+            closed = True
+        finally:
+            if not closed:
+                self.abort()
+            self.zip_file = None
+
+    def abort(self):
+        '''Stop writing without finishing the package, after an error. The
+        zip directory is not written, so a file object is left holding an
+        invalid archive rather than a truncated document; a file at
+        filename is removed.'''
+        zip_file, self.zip_file = self.zip_file, None
+        if zip_file is None:
+            return
+        fp, zip_file.fp = zip_file.fp, None
+        if fp is not None and not getattr(zip_file, '_filePassed', True):
+            fp.close()
+        if not hasattr(self.filename, 'write') and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
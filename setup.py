@@ -11,6 +11,12 @@ with open('requires.txt', 'r') as fh:
     install_requires = map(lambda s: s.strip(), filter(
         lambda l: not l.startswith('-e'), fh.readlines()))
 
+# Pillow is only needed for the sizes of images in formats other than
+# PNG, JPEG, GIF and WMF
+extras_require = {
+    'images': ['Pillow==2.8.2'],
+}
+
 def find_version(*file_paths):
     version_file = read(*file_paths)
     version_match = re.search(r"^__version__ = ['\"]([^'\"]*)['\"]",
@@ -43,5 +49,6 @@ setup(name="docx",
       license='MIT',
       packages=find_packages(),
       install_requires=install_requires,
+      extras_require=extras_require,
       zip_safe=False,
       )
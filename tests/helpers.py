@@ -0,0 +1,150 @@
+'''Template packages and part readers shared by the tests.
+
+Packages are written on the fly into temporary directories, so the
+tests need nothing but lxml.'''
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zipfile
+import zlib
+
+from lxml import etree
+
+from docx import NSPREFIXES
+
+W = '{%s}' % NSPREFIXES['w']
+R = '{%s}' % NSPREFIXES['r']
+WP = '{%s}' % NSPREFIXES['wp']
+
+DECLARATIONS = ' '.join('xmlns:%s="%s"' % item for item in sorted(NSPREFIXES.items()))
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>')
+
+PACKAGE_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>')
+
+# rId7 for the image, as Word numbers them: ids are not 1..n
+DOCUMENT_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '<Relationship Id="rId7" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+    'Target="media/image1.png"/>'
+    '</Relationships>')
+
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="%s">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/>'
+    '<w:basedOn w:val="Normal"/><w:rPr><w:b/></w:rPr></w:style>'
+    '</w:styles>' % NSPREFIXES['w'])
+
+# A paragraph with a placeholder split over two runs, a bookmarked one and
+# a picture with docPr id 5
+BODY = (
+    '<w:p><w:r><w:t>Dear {{na</w:t></w:r><w:r><w:rPr><w:b/></w:rPr><w:t>me}},</w:t></w:r></w:p>'
+    '<w:p><w:bookmarkStart w:id="0" w:name="Intro"/><w:r><w:t>Introduction</w:t></w:r>'
+    '<w:bookmarkEnd w:id="0"/></w:p>'
+    '<w:p><w:r><w:t>[[SECTION]]</w:t></w:r></w:p>'
+    '<w:p><w:r><w:drawing><wp:inline><wp:docPr id="5" name="Logo"/><a:graphic><a:graphicData>'
+    '<pic:pic><pic:blipFill><a:blip r:embed="rId7"/></pic:blipFill></pic:pic>'
+    '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+    '<w:p><w:r><w:t>Regards</w:t></w:r></w:p>'
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/></w:sectPr>')
+
+
+def document_xml(body=BODY):
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<w:document %s><w:body>%s</w:body></w:document>' % (DECLARATIONS, body))
+
+
+def png(width, height, seed=0):
+    '''Return a small truecolor PNG'''
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    row = b'\x00' + bytes(bytearray((seed * 37 + x) % 256 for x in range(width * 3)))
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(row * height)) +
+            chunk(b'IEND', b''))
+
+
+def write_package(path, parts):
+    package = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    for name, data in sorted(parts.items()):
+        package.writestr(name, data)
+    package.close()
+    return path
+
+
+def write_template(path, body=BODY, parts=None):
+    '''Write a template package at path and return path'''
+    package = {
+        '[Content_Types].xml': CONTENT_TYPES,
+        '_rels/.rels': PACKAGE_RELATIONSHIPS,
+        'word/_rels/document.xml.rels': DOCUMENT_RELATIONSHIPS,
+        'word/document.xml': document_xml(body),
+        'word/styles.xml': STYLES,
+        'word/media/image1.png': png(4, 3),
+    }
+    package.update(parts or {})
+    return write_package(path, package)
+
+
+def read_part(package, partname):
+    '''Return a part of a saved package, a path or a file object, parsed.
+    Opening it with zipfile also checks the archive.'''
+    zip_file = zipfile.ZipFile(package)
+    try:
+        assert zip_file.testzip() is None
+        return etree.fromstring(zip_file.read(partname))
+    finally:
+        zip_file.close()
+
+
+def canonical(element):
+    '''Canonical XML of an element, indentation left out'''
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.tostring(etree.fromstring(etree.tostring(element), parser), method='c14n')
+
+
+def paragraph_texts(document):
+    '''The text of each paragraph of a parsed document.xml'''
+    return [u''.join(t.text or u'' for t in p.iter(W + 't')) for p in document.iter(W + 'p')]
+
+
+class TempDirTestCase(unittest.TestCase):
+    '''A test case with a fresh directory, self.tmpdir, holding a
+    template package, self.template.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='docx-test-')
+        self.template = write_template(self.path('template.docx'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
@@ -0,0 +1,32 @@
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from docx.document import DocxDocument
+from docx.elements import table
+from docx.utils import make_element
+from tests.helpers import TempDirTestCase, W, paragraph_texts, read_part
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class AsyncDocxTest(TempDirTestCase):
+
+    def test_replace_with_element(self):
+        from docx.aio import AsyncDocx
+
+        loop = asyncio.new_event_loop()
+        try:
+            document = AsyncDocx(DocxDocument(template_file=self.template), loop=loop)
+            replacement = make_element('t', tagtext='Kind regards')
+            loop.run_until_complete(document.replace('Regards', replacement))
+            loop.run_until_complete(document.add(table([['a', 'b']], borders={'all': {'sz': 4, 'val': 'single'}})))
+            loop.run_until_complete(document.save_async(self.path('out.docx')))
+        finally:
+            loop.close()
+        document = read_part(self.path('out.docx'), 'word/document.xml')
+        self.assertIn(u'Kind regards', paragraph_texts(document))
+        borders = document.find('.//' + W + 'tblBorders')
+        self.assertEqual([el.get(W + 'sz') for el in borders], ['4'] * 6)
@@ -0,0 +1,48 @@
+from docx.document import DocxDocument
+from docx.elements import paragraph
+from tests.helpers import TempDirTestCase, W, paragraph_texts, read_part
+
+
+class AnchorTest(TempDirTestCase):
+
+    def test_add_at_positions(self):
+        document = DocxDocument(template_file=self.template)
+        document.get_text()
+        document.add(paragraph('first'), 0)
+        document.add(paragraph('after intro 1'), 'Intro')
+        document.add(paragraph('after intro 2'), 'Intro')
+        document.add(paragraph('section'), '[[SECTION]]')
+        # Indexes are those of the template, whatever was inserted since
+        document.add(paragraph('before regards'), 4)
+        self.assertRaises(ValueError, document.add, paragraph('nowhere'), 'No such text')
+        self.assertRaises(ValueError, document.add, paragraph('nowhere'), 9)
+
+        expected = [u'first', u'Dear {{name}},', u'Introduction', u'after intro 1', u'after intro 2',
+                    u'[[SECTION]]', u'section', u'', u'before regards', u'Regards']
+        self.assertEqual(document.get_text(), [text for text in expected if text])
+        for streaming in (True, False):
+            document.save(self.path('out.docx'), streaming=streaming)
+            saved = read_part(self.path('out.docx'), 'word/document.xml')
+            self.assertEqual(paragraph_texts(saved), expected)
+            self.assertEqual(saved.find(W + 'body')[-1].tag, W + 'sectPr')
+
+    def test_bookmark_in_added_content(self):
+        document = DocxDocument(template_file=self.template)
+        marked = paragraph('marked')
+        start = marked.makeelement(W + 'bookmarkStart', {W + 'id': '1', W + 'name': 'Added'})
+        marked.insert(0, start)
+        document.add(marked, 'Intro')
+        document.add(paragraph('after added'), 'Added')
+        self.assertEqual(document.get_text()[1:4], [u'Introduction', u'marked', u'after added'])
+
+    def test_end_of_body(self):
+        document = DocxDocument(template_file=self.template)
+        end = len(document.anchors.paragraphs)
+        document.add(paragraph('end 1'), end)
+        document.add(paragraph('{{end}}'), end)
+        document.add(paragraph('after end'), '{{end}}')
+        for streaming in (True, False):
+            document.save(self.path('out.docx'), streaming=streaming)
+            body = read_part(self.path('out.docx'), 'word/document.xml').find(W + 'body')
+            self.assertEqual(body[-1].tag, W + 'sectPr')
+            self.assertEqual(paragraph_texts(body)[-3:], [u'end 1', u'{{end}}', u'after end'])
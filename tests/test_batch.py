@@ -0,0 +1,28 @@
+import os
+
+from docx.batch import render_batch
+from tests.helpers import TempDirTestCase, paragraph_texts, read_part
+
+
+class RenderBatchTest(TempDirTestCase):
+
+    def records(self):
+        yield 'bob.docx', {'{{name}}': 'Bob'}
+        # The directory does not exist, so saving fails
+        yield os.path.join('missing', 'eve.docx'), {'{{name}}': 'Eve'}
+        yield 'ann.docx', [('{{name}}', 'Ann'), ('Regards', 'Best regards')]
+
+    def check(self, failures):
+        self.assertEqual([name for name, error in failures], [os.path.join('missing', 'eve.docx')])
+        self.assertIn('Error', failures[0][1])
+        # The placeholder of the template is split over two runs
+        bob = paragraph_texts(read_part(self.path('bob.docx'), 'word/document.xml'))
+        self.assertEqual(bob[0], u'Dear Bob,')
+        ann = paragraph_texts(read_part(self.path('ann.docx'), 'word/document.xml'))
+        self.assertEqual((ann[0], ann[-1]), (u'Dear Ann,', u'Best regards'))
+
+    def test_pool(self):
+        self.check(render_batch(self.template, self.records(), self.tmpdir, workers=2, chunksize=1))
+
+    def test_in_process(self):
+        self.check(render_batch(self.template, self.records(), self.tmpdir, workers=1))
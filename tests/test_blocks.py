@@ -0,0 +1,76 @@
+import zipfile
+
+from lxml import etree
+
+from docx.blocks import Block, BlockCache
+from docx.document import DocxDocument
+from docx.elements import paragraph, table
+from docx.writer import DocxWriter
+from tests.helpers import DECLARATIONS, TempDirTestCase, W, paragraph_texts, read_part
+
+NSMAP = etree.fromstring('<w:document %s/>' % DECLARATIONS).nsmap
+
+
+def signature():
+    return Block([paragraph('Kind regards'), table([['Name', 'Role'], ['Ann', 'CEO']])])
+
+
+class BlockTest(TempDirTestCase):
+
+    def check(self, path, count):
+        with zipfile.ZipFile(path) as saved:
+            data = saved.read('word/document.xml')
+        self.assertNotIn(b'docx-block', data)
+        self.assertEqual(data.count(b'xmlns:w='), 1)
+        document = read_part(path, 'word/document.xml')
+        texts = paragraph_texts(document)
+        self.assertEqual(texts.count(u'Kind regards'), count)
+        self.assertEqual(len(document.findall('.//' + W + 'tbl')), count)
+        return texts
+
+    def test_document(self):
+        block = signature()
+        document = DocxDocument(template_file=self.template)
+        document.block_cache = BlockCache()
+        document.add_block(block)
+        document.add(paragraph('between'))
+        document.add_block(block)
+        for streaming in (True, False):
+            document.save(self.path('out.docx'), streaming=streaming)
+            texts = self.check(self.path('out.docx'), 2)
+            used = [u'Kind regards', u'Name', u'Role', u'Ann', u'CEO']
+            self.assertEqual(texts[-11:], used + [u'between'] + used)
+        # Serialized once for both uses and both saves
+        self.assertEqual(document.block_cache.misses, 1)
+
+    def test_writer(self):
+        block = signature()
+        with DocxWriter(self.path('out.docx'), template_file=self.template) as writer:
+            writer.template.block_cache = BlockCache()
+            for i in range(3):
+                writer.add_block(block)
+                writer.add(paragraph('letter %d' % i))
+        texts = self.check(self.path('out.docx'), 3)
+        self.assertEqual([text for text in texts if text.startswith('letter')], [u'letter 0', u'letter 1', u'letter 2'])
+        self.assertEqual(read_part(self.path('out.docx'), 'word/document.xml').find(W + 'body')[-1].tag, W + 'sectPr')
+
+
+class BlockCacheTest(TempDirTestCase):
+
+    def test_lru_eviction_by_size(self):
+        blocks = [Block(paragraph('block %d ' % i + 'x' * 100)) for i in range(3)]
+        size = len(blocks[0].serialize(NSMAP))
+        cache = BlockCache(maxsize=2 * size)
+        cache.get(blocks[0], NSMAP)
+        cache.get(blocks[1], NSMAP)
+        # Block 0 is now the most recently used, so block 1 goes first
+        self.assertEqual(cache.get(blocks[0], NSMAP), blocks[0].serialize(NSMAP))
+        cache.get(blocks[2], NSMAP)
+        self.assertEqual((cache.hits, cache.misses, cache.size), (1, 3, 2 * size))
+        cache.get(blocks[0], NSMAP)
+        cache.get(blocks[2], NSMAP)
+        self.assertEqual(cache.hits, 3)
+        cache.get(blocks[1], NSMAP)
+        self.assertEqual(cache.misses, 4)
+        cache.clear()
+        self.assertEqual(cache.size, 0)
@@ -0,0 +1,57 @@
+import zipfile
+
+from docx.compression import CompressionPolicy, compression_policy
+from docx.document import DocxDocument
+from docx.elements import picture
+from tests.helpers import TempDirTestCase, png
+
+DEFLATED, STORED = zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED
+
+
+class CompressionPolicyTest(TempDirTestCase):
+
+    def test_presets(self):
+        expected = {
+            'default': {'word/document.xml': (DEFLATED, 6), 'word/media/a.png': (DEFLATED, 6)},
+            'fast': {'word/document.xml': (DEFLATED, 1), 'word/media/a.png': (STORED, None),
+                     'word/media/a.wmf': (DEFLATED, 1)},
+            'small': {'word/document.xml': (DEFLATED, 9), 'word/media/a.jpeg': (DEFLATED, 9)},
+            'store_media': {'word/document.xml': (DEFLATED, 6), 'word/media/a.png': (STORED, None),
+                            'word/media/a.JPG': (STORED, None), 'word/media/a.gif': (STORED, None),
+                            'word/media/a.emf': (DEFLATED, 6)},
+            'store': {'word/document.xml': (STORED, None), 'word/media/a.emf': (STORED, None)},
+        }
+        for name, parts in expected.items():
+            policy = compression_policy(name)
+            for partname, compression in parts.items():
+                self.assertEqual(policy.compression(partname), compression, (name, partname))
+        self.assertIs(compression_policy(None), compression_policy('default'))
+        self.assertRaises(ValueError, compression_policy, 'zstd')
+
+    def test_rules(self):
+        policy = CompressionPolicy(3, parts=[('word/media/big.png', 9), ('word/media/*', 0)],
+                                   types={'image/*': 1, 'application/xml': 0})
+        self.assertEqual(policy.compression('word/media/big.png'), (DEFLATED, 9))
+        self.assertEqual(policy.compression('word/media/a.png'), (STORED, None))
+        # Part rules come first, then type rules, then the default
+        self.assertEqual(policy.compression('word/embeddings/a.png'), (DEFLATED, 1))
+        self.assertEqual(policy.compression('word/styles.xml'), (STORED, None))
+        self.assertEqual(policy.compression('word/_rels/document.xml.rels'), (DEFLATED, 3))
+        self.assertEqual(policy.compression('word/vbaProject.bin'), (DEFLATED, 3))
+
+    def test_saved_parts(self):
+        image = self.path('image.png')
+        with open(image, 'wb') as f:
+            f.write(png(16, 16, 3))
+        document = DocxDocument(template_file=self.template)
+        document.add(picture(document, image, 'Picture'))
+        for streaming in (False, True):
+            document.save(self.path('out.docx'), streaming=streaming, compression='store_media')
+            with zipfile.ZipFile(self.path('out.docx')) as saved:
+                self.assertIsNone(saved.testzip())
+                types = dict((info.filename, info.compress_type) for info in saved.infolist())
+            added = [name for name in types if name.startswith('word/media/') and name != 'word/media/image1.png']
+            self.assertEqual(len(added), 1)
+            self.assertEqual(types[added[0]], STORED)
+            self.assertEqual(types['word/document.xml'], DEFLATED)
+            self.assertEqual(types['word/_rels/document.xml.rels'], DEFLATED)
@@ -0,0 +1,26 @@
+import zipfile
+
+from docx.document import DocxDocument
+from docx.extract import iter_text
+from tests.helpers import BODY, TempDirTestCase, write_template
+
+TEXT_BOX = '''
+<w:p><w:r><w:t>Before the box, </w:t></w:r><w:r><w:pict><v:shape><v:textbox><w:txbxContent>
+  <w:p><w:r><w:t>In the box</w:t></w:r></w:p>
+  <w:p><w:r><w:t>Also in the box</w:t></w:r></w:p>
+</w:txbxContent></v:textbox></v:shape></w:pict></w:r><w:r><w:t>after it</w:t></w:r></w:p>
+<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+'''
+
+
+class IterTextTest(TempDirTestCase):
+
+    def test_matches_get_text(self):
+        path = write_template(self.path('box.docx'), body=TEXT_BOX + BODY)
+        expected = DocxDocument(template_file=path).get_text()
+        self.assertEqual(expected[:4], [u'Before the box, after it', u'In the box', u'Also in the box', u'Cell'])
+        self.assertEqual(list(iter_text(path)), expected)
+        with open(path, 'rb') as f:
+            self.assertEqual(list(iter_text(f)), expected)
+        with zipfile.ZipFile(path) as zip_file:
+            self.assertEqual(list(iter_text(zip_file)), expected)
@@ -0,0 +1,79 @@
+import re
+import unittest
+
+from docx import advReplace
+from docx.document import DocxDocument
+from docx.index import _replace_in_runs
+from docx.utils import make_element
+from tests.helpers import TempDirTestCase, W, paragraph_texts, write_template
+
+
+def runs(*texts):
+    paragraph = make_element('p')
+    for text in texts:
+        run = make_element('r')
+        run.append(make_element('t', tagtext=text))
+        paragraph.append(run)
+    return paragraph
+
+
+def texts(paragraph):
+    return [t.text or '' for t in paragraph.iter(W + 't')]
+
+
+class ReplaceInRunsTest(unittest.TestCase):
+
+    def replace(self, blocks, search, replace, bs=3):
+        paragraph = runs(*blocks)
+        done = _replace_in_runs(list(paragraph.iter(W + 't')), re.compile(search), replace, bs)
+        return done, paragraph
+
+    def test_docstring_examples(self):
+        blocks = ['Hel', 'lo,', ' world!']
+        self.assertEqual(texts(self.replace(blocks, 'Hello,', 'Hi!')[1]), ['Hi!', '', ' world!'])
+        self.assertEqual(texts(self.replace(blocks, 'Hello, world', 'Hi!')[1]), ['Hi!', '', '!'])
+        self.assertEqual(texts(self.replace(blocks, 'Hel', 'Hal')[1]), ['Hal', 'lo,', ' world!'])
+
+    def test_several_matches_per_run(self):
+        done, paragraph = self.replace(['a-a-a', 'b-a'], 'a', 'x')
+        self.assertEqual(done, 4)
+        self.assertEqual(texts(paragraph), ['x-x-x', 'b-x'])
+
+    def test_matches_spanning_runs(self):
+        done, paragraph = self.replace(['{{na', 'me}} and {', '{name}', '}'], r'\{\{name\}\}', 'Bob')
+        self.assertEqual(done, 2)
+        self.assertEqual(texts(paragraph), ['Bob', ' and Bob', '', ''])
+        # Groups of the match are expanded
+        done, paragraph = self.replace(['2024-', '05-01'], r'(\d+)-(\d+)-(\d+)', r'\3.\2.\1')
+        self.assertEqual(texts(paragraph), ['01.05.2024', ''])
+
+    def test_block_limit(self):
+        blocks = ['a', 'b', 'c', 'd']
+        self.assertEqual(self.replace(blocks, 'abc', 'x', bs=3)[0], 1)
+        done, paragraph = self.replace(blocks, 'abcd', 'x', bs=3)
+        self.assertEqual((done, texts(paragraph)), (0, blocks))
+        self.assertEqual(self.replace(blocks, 'abcd', 'x', bs=4)[0], 1)
+
+    def test_element_replacement(self):
+        done, paragraph = self.replace(['Dear {{na', 'me}},'], r'\{\{name\}\}', make_element('br'))
+        self.assertEqual(texts(paragraph), ['Dear ', ','])
+        self.assertEqual(paragraph[0][0][0].tag, W + 'br')
+        done, paragraph = self.replace(['x {{name}}'], r'\{\{name\}\}', [make_element('br'), make_element('tab')])
+        self.assertEqual([el.tag for el in paragraph[0][0]], [W + 'br', W + 'tab'])
+
+
+class AdvReplaceTest(TempDirTestCase):
+
+    def test_document(self):
+        document = DocxDocument(template_file=self.template)
+        document.adv_replace(r'\{\{name\}\}', 'Bob')
+        self.assertEqual(document.get_text()[0], u'Dear Bob,')
+        # The text index is kept up to date
+        self.assertEqual(document.text_index.text(document.body[0])[0], u'Dear Bob,')
+        self.assertTrue(document.search('Bob') is not False)
+
+    def test_module_function(self):
+        document = DocxDocument(template_file=write_template(self.path('t.docx'),
+                                body='<w:p><w:r><w:t>Hel</w:t></w:r><w:r><w:t>lo, world!</w:t></w:r></w:p>'))
+        advReplace(document.document, 'Hello, world', 'Hi')
+        self.assertEqual(paragraph_texts(document.document), [u'Hi!'])
@@ -0,0 +1,37 @@
+import struct
+
+from docx.document import DocxDocument
+from docx.elements import picture
+from docx.media import image_size
+from tests.helpers import TempDirTestCase, WP, png, read_part
+
+
+class DrawingIdTest(TempDirTestCase):
+
+    def test_ids_follow_template_drawings(self):
+        image = self.path('image.png')
+        with open(image, 'wb') as f:
+            f.write(png(4, 4, 0))
+        document = DocxDocument(template_file=self.template)
+        document.add(picture(document, image, 'Picture'))
+        document.add(picture(document, image, 'Picture'))
+        document.save(self.path('out.docx'))
+        ids = [el.get('id') for el in read_part(self.path('out.docx'), 'word/document.xml').iter(WP + 'docPr')]
+        # The template's own drawing has id 5
+        self.assertEqual(ids, ['5', '6', '7'])
+
+
+class ImageSizeTest(TempDirTestCase):
+
+    def test_placeable_wmf(self):
+        # Key, handle, then bounds in 1440 units per inch: 1 by 0.5 inch
+        path = self.path('image.wmf')
+        with open(path, 'wb') as f:
+            f.write(b'\xd7\xcd\xc6\x9a' + struct.pack('<hhhhhHIH', 0, 0, 0, 1440, 720, 1440, 0, 0) + b'\x00' * 18)
+        self.assertEqual(image_size(path), (72, 36))
+
+    def test_png(self):
+        path = self.path('image.png')
+        with open(path, 'wb') as f:
+            f.write(png(30, 20, 0))
+        self.assertEqual(image_size(path), (30, 20))
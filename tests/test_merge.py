@@ -0,0 +1,148 @@
+import os
+import struct
+import zipfile
+import zlib
+
+from lxml import etree
+
+from docx.document import DocxDocument
+from docx.elements import paragraph, picture
+from docx.merge import DocxMerger, merge
+from tests.helpers import TempDirTestCase, R, W, WP, paragraph_texts, png, read_part, write_template
+
+
+# The CRC-32 table, and the index of each entry by its top byte
+CRC_TABLE = []
+for n in range(256):
+    for k in range(8):
+        n = (n >> 1) ^ 0xEDB88320 if n & 1 else n >> 1
+    CRC_TABLE.append(n)
+CRC_INDEX = dict((entry >> 24, index) for index, entry in enumerate(CRC_TABLE))
+
+
+def with_crc(data, crc):
+    """Return data with 4 bytes appended so that its CRC-32 is crc"""
+    target = crc ^ 0xffffffff
+    indexes = []
+    for i in range(4):
+        index = CRC_INDEX[target >> 24]
+        indexes.insert(0, index)
+        target = ((target ^ CRC_TABLE[index]) << 8) & 0xffffffff
+    register = zlib.crc32(data) & 0xffffffff ^ 0xffffffff
+    tail = []
+    for index in indexes:
+        tail.append((register ^ index) & 0xff)
+        register = (register >> 8) ^ CRC_TABLE[index]
+    return data + struct.pack('4B', *tail)
+
+
+class MergeTest(TempDirTestCase):
+
+    def source(self, i, image):
+        document = DocxDocument(template_file=self.template)
+        document.add(paragraph('customer %d' % i, style='Heading1'))
+        document.add(picture(document, image, 'Picture'))
+        link = paragraph('link')
+        hyperlink = etree.SubElement(link, W + 'hyperlink')
+        hyperlink.set(R + 'id', document.word_relationships.add_hyperlink('http://example.com/'))
+        document.add(link)
+        path = self.path('source%d.docx' % i)
+        document.save(path)
+        return path
+
+    def images(self):
+        paths = []
+        for i in range(2):
+            path = self.path('image%d.png' % i)
+            with open(path, 'wb') as f:
+                f.write(png(8 + i, 8, i))
+            paths.append(path)
+        return paths
+
+    def test_merge(self):
+        images = self.images()
+        sources = [self.source(i, images[i % 2]) for i in range(5)]
+        self.assertEqual(merge(iter(sources), self.path('merged.docx')), 5)
+
+        output = zipfile.ZipFile(self.path('merged.docx'))
+        document = read_part(self.path('merged.docx'), 'word/document.xml')
+        relationships = read_part(self.path('merged.docx'), 'word/_rels/document.xml.rels')
+        ids = dict((r.get('Id'), r) for r in relationships)
+
+        # Every reference resolves, and shared targets are stored once
+        used = set(value for el in document.iter() for name, value in el.attrib.items() if name.startswith(R))
+        self.assertEqual(used - set(ids), set())
+        links = [r for r in relationships if r.get('TargetMode') == 'External']
+        self.assertEqual(len(links), 1)
+        media = [name for name in output.namelist() if name.startswith('word/media/')]
+        self.assertEqual(len(media), 3)
+
+        texts = paragraph_texts(document)
+        self.assertEqual([text for text in texts if text.startswith('customer')],
+                         ['customer %d' % i for i in range(5)])
+        # A section break between each pair of sources, then the final one
+        self.assertEqual(len(list(document.iter(W + 'sectPr'))), 5)
+        docpr = [el.get('id') for el in document.iter(WP + 'docPr')]
+        self.assertEqual(len(docpr), len(set(docpr)))
+
+        # Identical styles are not repeated
+        styles = read_part(self.path('merged.docx'), 'word/styles.xml')
+        self.assertEqual([s.get(W + 'styleId') for s in styles.iter(W + 'style')], ['Normal', 'Heading1'])
+
+        # Merged bodies use the root's namespace declarations
+        data = output.read('word/document.xml')
+        self.assertEqual(data.count(b'xmlns:w='), 1)
+
+    def test_different_style_gets_new_id(self):
+        other = write_template(self.path('other.docx'), parts={'word/styles.xml': (
+            '<w:styles xmlns:w="%s"><w:style w:type="paragraph" w:styleId="Heading1">'
+            '<w:name w:val="heading 1"/><w:rPr><w:i/></w:rPr></w:style></w:styles>' % W[1:-1])},
+            body='<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>other</w:t></w:r></w:p>')
+        merge([self.template, other], self.path('merged.docx'))
+        document = read_part(self.path('merged.docx'), 'word/document.xml')
+        styles = read_part(self.path('merged.docx'), 'word/styles.xml')
+        self.assertEqual([s.get(W + 'styleId') for s in styles.iter(W + 'style')],
+                         ['Normal', 'Heading1', 'Heading12'])
+        self.assertEqual(document.find('.//' + W + 'pStyle').get(W + 'val'), 'Heading12')
+        self.assertEqual(paragraph_texts(document)[-2:], [u'', u'other'])
+
+    def test_without_with(self):
+        letterhead = write_template(self.path('letterhead.docx'),
+                                    body='<w:p><w:r><w:t>LETTERHEAD</w:t></w:r></w:p>')
+        source = write_template(self.path('source.docx'), body='<w:p><w:r><w:t>SOURCE A</w:t></w:r></w:p>')
+        merger = DocxMerger(self.path('merged.docx'), template_file=letterhead)
+        merger.add(source)
+        merger.close()
+        document = read_part(self.path('merged.docx'), 'word/document.xml')
+        self.assertEqual([text for text in paragraph_texts(document) if text], [u'LETTERHEAD', u'SOURCE A'])
+
+    def test_images_with_the_same_crc(self):
+        first = png(8, 8, 1)
+        second = with_crc(png(8, 8, 2)[:-4], zlib.crc32(first) & 0xffffffff)
+        self.assertEqual((zlib.crc32(first), len(first)), (zlib.crc32(second), len(second)))
+        sources = []
+        for i, data in enumerate((first, second)):
+            image = self.path('image%d.png' % i)
+            with open(image, 'wb') as f:
+                f.write(data)
+            document = DocxDocument(template_file=self.template)
+            document.add(picture(document, image, 'Picture'))
+            sources.append(self.path('source%d.docx' % i))
+            document.save(sources[-1])
+        merge(sources, self.path('merged.docx'))
+
+        output = zipfile.ZipFile(self.path('merged.docx'))
+        relationships = read_part(self.path('merged.docx'), 'word/_rels/document.xml.rels')
+        targets = dict((r.get('Id'), r.get('Target')) for r in relationships)
+        document = read_part(self.path('merged.docx'), 'word/document.xml')
+        embedded = [output.read('word/' + targets[el.get(R + 'embed')])
+                    for el in document.iter() if el.get(R + 'embed')]
+        # The template's own image in each source, then each picture
+        self.assertEqual(embedded[1], first)
+        self.assertEqual(embedded[3], second)
+        output.close()
+
+    def test_error_discards_output(self):
+        source = write_template(self.path('source.docx'), body='<w:p><w:r><w:t>SOURCE A</w:t></w:r></w:p>')
+        self.assertRaises(IOError, merge, [source, self.path('missing.docx')], self.path('merged.docx'))
+        self.assertFalse(os.path.exists(self.path('merged.docx')))
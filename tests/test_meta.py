@@ -0,0 +1,89 @@
+import unittest
+
+from lxml import etree
+
+from docx.document import DocxDocument
+from docx.meta import HYPERLINK_RELATIONSHIP, IMAGE_RELATIONSHIP, RELATIONSHIP_TYPES, WordRelationships
+from tests.helpers import TempDirTestCase, read_part
+
+STYLES_RELATIONSHIP = RELATIONSHIP_TYPES + 'styles'
+RELS = ('<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="%s" Target="styles.xml"/>'
+        '<Relationship Id="rId7" Type="%s" Target="media/image1.png"/>'
+        '<Relationship Id="rId12" Type="%s" Target="http://example.com/" TargetMode="External"/>'
+        '<Relationship Id="custom" Type="%s" Target="media/image2.png"/>'
+        '</Relationships>' % (STYLES_RELATIONSHIP, IMAGE_RELATIONSHIP, HYPERLINK_RELATIONSHIP, IMAGE_RELATIONSHIP))
+
+
+class WordRelationshipsTest(unittest.TestCase):
+
+    def test_ids_above_template_ids(self):
+        relationships = WordRelationships(xml=RELS)
+        # rId2 to rId11 are free, but an id is never below one loaded
+        self.assertEqual(relationships.add(IMAGE_RELATIONSHIP, 'media/image3.png'), 'rId13')
+        self.assertEqual(relationships.next_id(), 'rId14')
+        self.assertEqual(relationships.add(IMAGE_RELATIONSHIP, 'media/image4.png'), 'rId15')
+        self.assertRaises(ValueError, relationships.add, IMAGE_RELATIONSHIP, 'media/image5.png', relid='rId7')
+        self.assertEqual(relationships.add(IMAGE_RELATIONSHIP, 'media/image5.png', relid='rId30'), 'rId30')
+        self.assertEqual(relationships.next_id(), 'rId31')
+
+    def test_lookups(self):
+        relationships = WordRelationships(xml=RELS)
+        self.assertEqual(relationships.get('rId12'),
+                         ['rId12', HYPERLINK_RELATIONSHIP, 'http://example.com/', 'External'])
+        self.assertIsNone(relationships.get('rId2'))
+        self.assertEqual(relationships.find(IMAGE_RELATIONSHIP, 'media/image2.png'), 'custom')
+        self.assertIsNone(relationships.find(HYPERLINK_RELATIONSHIP, 'http://example.com/'))
+        self.assertEqual([r[0] for r in relationships.of_type(IMAGE_RELATIONSHIP)], ['rId7', 'custom'])
+
+    def test_get_or_add_and_add_many(self):
+        relationships = WordRelationships(xml=RELS)
+        self.assertEqual(relationships.get_or_add(IMAGE_RELATIONSHIP, 'media/image1.png'), 'rId7')
+        ids = relationships.add_many([(IMAGE_RELATIONSHIP, 'media/new.png'),
+                                      (IMAGE_RELATIONSHIP, 'media/image1.png'),
+                                      (IMAGE_RELATIONSHIP, 'media/new.png'),
+                                      (HYPERLINK_RELATIONSHIP, 'http://example.com/', 'External')])
+        self.assertEqual(ids, ['rId13', 'rId7', 'rId13', 'rId12'])
+        self.assertEqual(len(relationships), 5)
+
+    def test_hyperlinks(self):
+        relationships = WordRelationships(xml=RELS)
+        self.assertEqual(relationships.add_hyperlink('http://example.com/'), 'rId12')
+        relid = relationships.add_hyperlink('http://example.org/')
+        self.assertEqual(relationships.add_hyperlink('http://example.org/'), relid)
+        written = dict((el.get('Id'), el) for el in relationships._xml())
+        self.assertEqual((written[relid].get('Target'), written[relid].get('TargetMode')),
+                         ('http://example.org/', 'External'))
+        self.assertIsNone(written['rId7'].get('TargetMode'))
+        # Loaded again, the mode is kept
+        again = WordRelationships(xml=etree.tostring(relationships._xml()))
+        self.assertEqual(again.get(relid)[3], 'External')
+
+    def test_direct_append(self):
+        relationships = WordRelationships(xml=RELS)
+        relationships.find(IMAGE_RELATIONSHIP, 'media/image1.png')
+        relationships.relationshiplist.append(['rId40', IMAGE_RELATIONSHIP, 'media/appended.png'])
+        self.assertEqual(relationships.find(IMAGE_RELATIONSHIP, 'media/appended.png'), 'rId40')
+        self.assertEqual(relationships.get_or_add(IMAGE_RELATIONSHIP, 'media/appended.png'), 'rId40')
+        self.assertEqual(relationships.next_id(), 'rId41')
+        # Anything else needs a reindex()
+        del relationships.relationshiplist[1]
+        relationships.reindex()
+        self.assertIsNone(relationships.get('rId7'))
+        self.assertEqual(len(relationships.of_type(IMAGE_RELATIONSHIP)), 2)
+
+    def test_default_relationships(self):
+        relationships = WordRelationships()
+        self.assertEqual(relationships.add_hyperlink('http://example.com/'), 'rId7')
+
+
+class DocumentRelationshipsTest(TempDirTestCase):
+
+    def test_saved_ids_do_not_collide(self):
+        document = DocxDocument(template_file=self.template)
+        relid = document.word_relationships.add_hyperlink('http://example.com/')
+        document.save(self.path('out.docx'))
+        relationships = read_part(self.path('out.docx'), 'word/_rels/document.xml.rels')
+        ids = [el.get('Id') for el in relationships]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertIn(relid, ids)
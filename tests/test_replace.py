@@ -0,0 +1,78 @@
+import re
+import unittest
+
+from docx.document import DocxDocument
+from docx.utils import MultiPattern, make_element
+from tests.helpers import TempDirTestCase, paragraph_texts, read_part, write_template
+
+BODY = ('<w:p><w:r><w:t>Regards, Mr. Smith</w:t></w:r></w:p>'
+        '<w:p><w:r><w:t>Order 1234 of 2024-05-01</w:t></w:r></w:p>'
+        '<w:p><w:r><w:t>regards again</w:t></w:r></w:p>')
+
+
+def matches(pairs, text):
+    return [(index, match.group()) for index, match in MultiPattern(pairs).finditer(text)]
+
+
+class MultiPatternTest(unittest.TestCase):
+
+    def test_literals(self):
+        patterns = MultiPattern([('Mr\\.', 'M.'), ('Smith', 'Jones'), ('Mr', 'X')])
+        self.assertEqual(patterns.literals, {u'Mr.': 0, u'Smith': 1, u'Mr': 2})
+        self.assertEqual([(index, match.group()) for index, match in patterns.finditer(u'Mr. Smith, Mr Smith')],
+                         [(0, u'Mr.'), (1, u'Smith'), (2, u'Mr'), (1, u'Smith')])
+        self.assertIsNone(MultiPattern([('a.c', 'x'), ('abc', 'y')]).literals)
+        self.assertIsNone(MultiPattern([(re.compile('abc', re.I), 'x')]).literals)
+
+    def test_groups_and_backreferences(self):
+        patterns = MultiPattern([(r'(\d{4})-(\d\d)-(\d\d)', r'\3/\2/\1'), (r'(o)\1', 'OO'),
+                                 (r'(?P<a>x)(?P=a)', 'XX')])
+        self.assertEqual([patterns.expand(index, match) for index, match in patterns.finditer(u'2024-05-01 took xx')],
+                         [u'01/05/2024', u'OO', u'XX'])
+
+    def test_flags(self):
+        text = u'Regards, Mr. Smith regards'
+        self.assertEqual(matches([(re.compile('regards', re.I), 'X'), ('Smith', 'Y')], text),
+                         [(0, u'Regards'), (1, u'Smith'), (0, u'regards')])
+        self.assertEqual(matches([('(?i)regards', 'X'), ('Smith', 'Y')], text),
+                         [(0, u'Regards'), (1, u'Smith'), (0, u'regards')])
+        self.assertEqual(matches([('(?i)regards', 'X')], text), [(0, u'Regards'), (0, u'regards')])
+
+    def test_same_group_names(self):
+        self.assertEqual(matches([('(?P<n>Regards)', 'X'), ('(?P<n>Smith)', 'Y')], u'Regards, Mr. Smith'),
+                         [(0, u'Regards'), (1, u'Smith')])
+
+    def test_order(self):
+        # The first pattern wins a tie and matches do not overlap, with or
+        # without an alternation
+        pairs = [('ab', '1'), ('abc', '2'), ('bc', '3')]
+        self.assertEqual(matches(pairs, u'abcabc'), [(0, u'ab'), (0, u'ab')])
+        pairs = [(re.compile('ab'), '1'), (re.compile('abc', re.I), '2'), ('c', '3')]
+        self.assertEqual(matches(pairs, u'abcABC'), [(0, u'ab'), (2, u'c'), (1, u'ABC')])
+
+
+class ReplaceTest(TempDirTestCase):
+
+    def document(self):
+        return DocxDocument(template_file=write_template(self.path('replace.docx'), body=BODY))
+
+    def test_replace(self):
+        document = self.document()
+        document.replace(re.compile('Regards'), 'Best')
+        document.replace('(?i)regards', 'Cheers')
+        document.replace(r'(\d{4})-(\d\d)-(\d\d)', r'\3/\2/\1')
+        self.assertEqual(document.get_text(), [u'Best, Mr. Smith', u'Order 1234 of 01/05/2024', u'Cheers again'])
+
+    def test_replace_many(self):
+        document = self.document()
+        document.replace_many([('Mr\\.', 'Ms.'), ('Smith', 'Jones'), (r'Order (\d+)', r'Invoice \1'),
+                               (re.compile('REGARDS', re.I), 'Thanks')])
+        self.assertEqual(document.get_text(), [u'Thanks, Ms. Jones', u'Invoice 1234 of 2024-05-01', u'Thanks again'])
+
+    def test_replace_with_element(self):
+        document = self.document()
+        # An element takes the place of the whole text element matched
+        document.replace_many([('Smith', make_element('t', tagtext='Dear Ms. Doe')), ('again', 'twice')])
+        document.save(self.path('out.docx'))
+        saved = read_part(self.path('out.docx'), 'word/document.xml')
+        self.assertEqual(paragraph_texts(saved), [u'Dear Ms. Doe', u'Order 1234 of 2024-05-01', u'regards twice'])
@@ -0,0 +1,31 @@
+import zipfile
+
+from docx.document import DocxDocument
+from docx.elements import paragraph
+from tests.helpers import TempDirTestCase, canonical, paragraph_texts, read_part
+
+
+class StreamingSaveTest(TempDirTestCase):
+
+    def build(self, count=200):
+        document = DocxDocument(template_file=self.template)
+        for i in range(count):
+            document.add(paragraph([['paragraph %d ' % i, 'b'], ['<&>', '']]))
+        return document
+
+    def test_streaming_matches_tostring(self):
+        self.build().save(self.path('plain.docx'))
+        self.build().save(self.path('streamed.docx'), streaming=True)
+        plain = read_part(self.path('plain.docx'), 'word/document.xml')
+        streamed = read_part(self.path('streamed.docx'), 'word/document.xml')
+        self.assertEqual(paragraph_texts(streamed), paragraph_texts(plain))
+        self.assertEqual(canonical(streamed), canonical(plain))
+
+    def test_streaming_does_not_redeclare_namespaces(self):
+        self.build().save(self.path('plain.docx'))
+        self.build().save(self.path('streamed.docx'), streaming=True)
+        plain = zipfile.ZipFile(self.path('plain.docx')).getinfo('word/document.xml').file_size
+        streamed = zipfile.ZipFile(self.path('streamed.docx')).getinfo('word/document.xml').file_size
+        self.assertTrue(streamed <= plain * 1.05, (streamed, plain))
+        data = zipfile.ZipFile(self.path('streamed.docx')).read('word/document.xml')
+        self.assertEqual(data.count(b'xmlns:w='), 1)
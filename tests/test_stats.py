@@ -0,0 +1,62 @@
+import zipfile
+
+from docx.document import DocxDocument
+from docx.stats import DocxStats, Stat
+from tests.helpers import TempDirTestCase
+
+
+class DocxStatsTest(TempDirTestCase):
+
+    def test_save_and_load(self):
+        document = DocxDocument(template_file=self.template)
+        calls = []
+        document.stats.add_hook(lambda kind, stat: calls.append((kind, stat.name)))
+        document.replace('Regards', 'Best regards')
+        document.save(self.path('out.docx'))
+        stats = document.stats
+
+        # Each part as written into the package
+        with zipfile.ZipFile(self.path('out.docx')) as saved:
+            infos = saved.infolist()
+        self.assertEqual(sorted(stats.saved_parts), sorted(info.filename for info in infos))
+        for info in infos:
+            stat = stats.saved_parts[info.filename]
+            self.assertEqual((stat.bytes_in, stat.bytes_out), (info.file_size, info.compress_size))
+        document_stat = stats.saved_parts['word/document.xml']
+        self.assertLess(document_stat.ratio, 1)
+        self.assertEqual(stats.phases['save'].bytes_out, sum(info.compress_size for info in infos))
+
+        # Parts read on first access count towards parse only
+        loaded = stats.loaded_parts['word/document.xml']
+        self.assertLess(loaded.bytes_in, loaded.bytes_out)
+        self.assertEqual(stats.phases['parse'].bytes_out, sum(s.bytes_out for s in stats.loaded_parts.values()))
+        self.assertEqual(stats.phases['replace'].bytes_out, 0)
+
+        self.assertIn(('load', 'word/document.xml'), calls)
+        self.assertIn(('save', 'word/document.xml'), calls)
+        self.assertIn(('phase', 'replace'), calls)
+        self.assertEqual(calls[-1], ('phase', 'save'))
+        self.assertIn('word/document.xml', stats.summary())
+
+    def test_hooks_and_reset(self):
+        stats = DocxStats()
+        calls = []
+        hook = lambda kind, stat: calls.append((kind, stat.name, stat.calls))
+        stats.add_hook(hook)
+        with stats.phase('outer'):
+            stats.part('save', 'a.xml', 0.0, 100, 25)
+            with stats.phase('inner'):
+                stats.part('load', 'b.xml', 0.0, 10, 40)
+        with stats.phase('outer'):
+            pass
+        self.assertEqual(calls, [('save', 'a.xml', 1), ('load', 'b.xml', 1), ('phase', 'inner', 1),
+                                 ('phase', 'outer', 1), ('phase', 'outer', 2)])
+        self.assertEqual(stats.saved_parts['a.xml'].ratio, 0.25)
+        self.assertEqual((stats.phases['outer'].bytes_in, stats.phases['inner'].bytes_in), (100, 10))
+        self.assertIsNone(Stat('empty').ratio)
+        stats.reset()
+        self.assertEqual((list(stats.phases), list(stats.saved_parts)), ([], []))
+        stats.remove_hook(hook)
+        with stats.phase('after'):
+            pass
+        self.assertEqual(len(calls), 5)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import io
+import zipfile
+
+from docx.document import DocxDocument
+from docx.elements import picture
+from docx.template import CompiledTemplate, PlaceholderTemplate
+from tests.helpers import CONTENT_TYPES, R, TempDirTestCase, W, canonical, paragraph_texts, png, read_part, \
+    write_template
+
+CT = '{http://schemas.openxmlformats.org/package/2006/content-types}'
+# Defaults a template may declare beyond those ContentTypes knows of
+EXTRA_DEFAULTS = CONTENT_TYPES.replace('<Override', '<Default Extension="emf" ContentType="image/x-emf"/>'
+                                       '<Default Extension="jpg" ContentType="image/jpeg"/><Override', 1)
+
+
+def defaults(package):
+    return dict((el.get('Extension'), el.get('ContentType'))
+                for el in read_part(package, '[Content_Types].xml').iter(CT + 'Default'))
+
+
+class CompiledTemplateTest(TempDirTestCase):
+
+    def setUp(self):
+        super(CompiledTemplateTest, self).setUp()
+        self.template = write_template(self.path('extra.docx'), parts={'[Content_Types].xml': EXTRA_DEFAULTS})
+
+    def test_untouched_parts_are_copied(self):
+        document = CompiledTemplate(self.template).render()
+        document.replace('Regards', 'Kind regards')
+        document.save(self.path('out.docx'))
+        self.assertEqual(paragraph_texts(read_part(self.path('out.docx'), 'word/document.xml'))[-1], u'Kind regards')
+        with zipfile.ZipFile(self.path('out.docx')) as output, zipfile.ZipFile(self.template) as source:
+            self.assertEqual(sorted(output.namelist()), sorted(source.namelist()))
+            for name in ('[Content_Types].xml', 'word/_rels/document.xml.rels'):
+                self.assertEqual(output.read(name), source.read(name))
+
+    def test_rewritten_content_types_keep_template_defaults(self):
+        image = self.path('image.png')
+        with open(image, 'wb') as f:
+            f.write(png(4, 4, 1))
+        for document in (CompiledTemplate(self.template).render(), DocxDocument(template_file=self.template)):
+            document.add(picture(document, image, 'Picture'))
+            document.save(self.path('out.docx'))
+            found = defaults(self.path('out.docx'))
+            self.assertEqual((found['emf'], found['jpg'], found['png']), ('image/x-emf', 'image/jpeg', 'image/png'))
+            relationships = read_part(self.path('out.docx'), 'word/_rels/document.xml.rels')
+            self.assertEqual(len(relationships), 3)
+
+
+class PlaceholderTemplateTest(TempDirTestCase):
+
+    def test_render(self):
+        template = PlaceholderTemplate(self.template)
+        self.assertEqual(template.names, set(['name']))
+        template.render({'name': u'Tom & <Jerry> é'}, self.path('out.docx'))
+
+        document = read_part(self.path('out.docx'), 'word/document.xml')
+        self.assertEqual(paragraph_texts(document)[0], u'Dear Tom & <Jerry> é,')
+        # The same text as replacing across runs in the document tree
+        expected = DocxDocument(template_file=self.template)
+        expected.adv_replace(r'\{\{name\}\}', u'Tom & <Jerry> é')
+        self.assertEqual(paragraph_texts(document), paragraph_texts(expected.document))
+
+        relationships = read_part(self.path('out.docx'), 'word/_rels/document.xml.rels')
+        self.assertEqual(set(r.get('Id') for r in relationships),
+                         set(el.get(R + 'embed') for el in document.iter() if el.get(R + 'embed')) | set(['rId1']))
+        read_part(self.path('out.docx'), '[Content_Types].xml')
+        with zipfile.ZipFile(self.path('out.docx')) as output, zipfile.ZipFile(self.template) as source:
+            self.assertEqual(sorted(output.namelist()), sorted(source.namelist()))
+            # Parts not rendered are copied as stored
+            for name in ('word/styles.xml', 'word/media/image1.png', 'word/_rels/document.xml.rels',
+                         '[Content_Types].xml'):
+                self.assertEqual(output.getinfo(name).CRC, source.getinfo(name).CRC)
+                self.assertEqual(output.read(name), source.read(name))
+
+    def test_render_bytes(self):
+        template = PlaceholderTemplate(self.template)
+        data = template.render({}, compression='small')
+        document = read_part(io.BytesIO(data), 'word/document.xml')
+        # Placeholders without a value are left as they are
+        self.assertEqual(paragraph_texts(document)[0], u'Dear {{name}},')
+        self.assertEqual(canonical(document.find(W + 'body')[-1]),
+                         canonical(DocxDocument(template_file=self.template).body[-1]))
+
+    def test_render_keeps_template_defaults(self):
+        template = write_template(self.path('extra.docx'), parts={'[Content_Types].xml': EXTRA_DEFAULTS})
+        PlaceholderTemplate(template).render({'name': 'Bob'}, self.path('out.docx'))
+        self.assertEqual(defaults(self.path('out.docx')), defaults(template))
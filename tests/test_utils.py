@@ -0,0 +1,21 @@
+import unittest
+
+from lxml import etree
+
+from docx.utils import make_element, sub_element
+from tests.helpers import R, W
+
+
+class ElementTest(unittest.TestCase):
+
+    def test_sub_element_matches_make_element(self):
+        for kwargs in ({'attributes': {'val': 'x'}},
+                       {'nsprefix': 'wp', 'attributes': {'id': '1'}},
+                       {'attributes': {'id': 'rId1'}, 'attrnsprefix': 'r'},
+                       {'tagtext': 'text'}):
+            made = make_element('tag', **kwargs)
+            parent = etree.Element('parent')
+            sub = sub_element(parent, 'tag', **kwargs)
+            self.assertEqual((made.tag, dict(made.attrib), made.text), (sub.tag, dict(sub.attrib), sub.text))
+        self.assertEqual(make_element('tag', attributes={'val': 'x'}).get(W + 'val'), 'x')
+        self.assertEqual(make_element('tag', attributes={'id': 'rId1'}, attrnsprefix='r').get(R + 'id'), 'rId1')
@@ -0,0 +1,87 @@
+import io
+import os
+import zipfile
+
+from docx.document import DocxDocument
+from docx.elements import heading, paragraph, table
+from docx.writer import DocxWriter
+from tests.helpers import TempDirTestCase, W, canonical, paragraph_texts, read_part
+
+
+class DocxWriterTest(TempDirTestCase):
+
+    def test_round_trip(self):
+        with DocxWriter(self.path('out.docx'), template_file=self.template) as writer:
+            writer.add(heading('Report', 1))
+            writer.add_table([['a', 'b'], ['1 & 2', '<3>'], ['4', '5']])
+            for i in range(50):
+                writer.add(paragraph('line %d' % i))
+        document = read_part(self.path('out.docx'), 'word/document.xml')
+        texts = paragraph_texts(document)
+        # The template body comes first, then what was added
+        self.assertEqual(texts[:2], [u'Dear {{name}},', u'Introduction'])
+        self.assertEqual(texts[-1], u'line 49')
+        self.assertTrue(u'1 & 2' in texts and u'<3>' in texts)
+        body = document.find(W + 'body')
+        self.assertEqual(body[-1].tag, W + 'sectPr')
+        self.assertEqual(len(body.findall(W + 'tbl')), 1)
+        self.assertEqual(len(body.find(W + 'tbl').findall(W + 'tr')), 3)
+        # Written with the template's prefixes, declared once on the root
+        data = zipfile.ZipFile(self.path('out.docx')).read('word/document.xml')
+        self.assertEqual(data.count(b'xmlns:w='), 1)
+        self.assertFalse(b'ns0:' in data)
+
+    def test_matches_document_save(self):
+        elements = lambda: [heading('Report', 1), table([['a', 'b'], ['c', 'd']])] + \
+            [paragraph('line %d' % i) for i in range(100)]
+        with DocxWriter(self.path('writer.docx'), template_file=self.template) as writer:
+            for element in elements():
+                writer.add(element)
+        document = DocxDocument(template_file=self.template)
+        # DocxDocument.add() appends after the template's final sectPr
+        sectpr = document.body[-1]
+        for element in elements():
+            document.add(element)
+        document.body.append(sectpr)
+        document.save(self.path('document.docx'))
+        written = read_part(self.path('writer.docx'), 'word/document.xml')
+        saved = read_part(self.path('document.docx'), 'word/document.xml')
+        self.assertEqual(canonical(written), canonical(saved))
+        size = lambda name: zipfile.ZipFile(self.path(name)).getinfo('word/document.xml').file_size
+        self.assertTrue(size('writer.docx') <= size('document.docx') * 1.05)
+
+    def test_file_object(self):
+        output = io.BytesIO()
+        with DocxWriter(output, template_file=self.template) as writer:
+            writer.add(paragraph('in memory'))
+        output.seek(0)
+        self.assertEqual(paragraph_texts(read_part(output, 'word/document.xml'))[-1], u'in memory')
+
+    def test_error_discards_output(self):
+        def rows():
+            yield ['h1', 'h2']
+            yield ['a', 'b']
+            raise RuntimeError('producer failed')
+        path = self.path('out.docx')
+        with self.assertRaises(RuntimeError):
+            with DocxWriter(path, template_file=self.template) as writer:
+                writer.add(paragraph('before'))
+                writer.add_table(rows())
+        self.assertFalse(os.path.exists(path))
+
+        output = io.BytesIO()
+        with self.assertRaises(RuntimeError):
+            with DocxWriter(output, template_file=self.template) as writer:
+                writer.add(paragraph('before'))
+                raise RuntimeError('producer failed')
+        self.assertFalse(output.closed)
+        self.assertRaises(zipfile.BadZipfile, zipfile.ZipFile, output)
+
+    def test_none_cells_are_empty(self):
+        with DocxWriter(self.path('out.docx'), template_file=self.template) as writer:
+            writer.add_table([['h1', 'h2'], [None, 'x']])
+        saved = read_part(self.path('out.docx'), 'word/document.xml')
+        cells = [u''.join(t.text or u'' for t in cell.iter(W + 't')) for cell in saved.iter(W + 'tc')]
+        expected = table([['h1', 'h2'], [None, 'x']])
+        self.assertEqual(cells, [u''.join(t.text or u'' for t in cell.iter(W + 't')) for cell in expected.iter(W + 'tc')])
+        self.assertEqual(cells, [u'h1', u'h2', u'', u'x'])
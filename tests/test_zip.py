@@ -0,0 +1,74 @@
+import io
+import zipfile
+
+from docx.document import DocxDocument
+from docx.utils import copy_raw_member, read_raw_member, write_member, write_raw_member
+from tests.helpers import TempDirTestCase, read_part
+
+PARTS = [
+    ('word/document.xml', b'<document>' + b'text ' * 1000 + b'</document>', zipfile.ZIP_DEFLATED),
+    ('word/media/image1.png', b'\x89PNG\r\n\x1a\n' + bytes(bytearray(range(256))), zipfile.ZIP_STORED),
+    ('empty.xml', b'', zipfile.ZIP_DEFLATED),
+]
+
+
+class RawMemberTest(TempDirTestCase):
+
+    def source(self):
+        path = self.path('source.zip')
+        with zipfile.ZipFile(path, 'w') as source:
+            for name, data, compress_type in PARTS:
+                source.writestr(name, data, compress_type)
+            source.comment = b'comment'
+        return path
+
+    def check(self, output):
+        with zipfile.ZipFile(output) as copied, zipfile.ZipFile(self.path('source.zip')) as source:
+            self.assertIsNone(copied.testzip())
+            self.assertEqual(copied.namelist(), [name for name, data, compress_type in PARTS] + ['after.xml'])
+            for name, data, compress_type in PARTS:
+                info, original = copied.getinfo(name), source.getinfo(name)
+                self.assertEqual(copied.read(name), data)
+                self.assertEqual((info.CRC, info.compress_type, info.compress_size),
+                                 (original.CRC, original.compress_type, original.compress_size))
+            # Members written the usual way still land after the copied ones
+            self.assertEqual(copied.read('after.xml'), b'<after/>')
+
+    def test_copy_raw_member(self):
+        for output in (self.path('copied.zip'), io.BytesIO()):
+            with zipfile.ZipFile(self.source()) as source, zipfile.ZipFile(output, 'w') as copied:
+                for zinfo in source.infolist():
+                    copy_raw_member(source, zinfo, copied, chunk_size=100)
+                copied.writestr('after.xml', b'<after/>')
+            self.check(output)
+
+    def test_read_and_write_raw_member(self):
+        with zipfile.ZipFile(self.source()) as source:
+            members = [(zinfo, read_raw_member(source, zinfo)) for zinfo in source.infolist()]
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as copied:
+            for zinfo, data in members:
+                write_raw_member(copied, zinfo, data)
+            write_member(copied, 'after.xml', b'<after/>', level=1)
+        self.check(output)
+
+    def test_save_copies_untouched_parts(self):
+        document = DocxDocument(template_file=self.template)
+        document.replace('Regards', 'Kind regards')
+        for compression in (None, 'small'):
+            output = self.path('out.docx')
+            document.save(output, compression=compression)
+            with zipfile.ZipFile(output) as saved, zipfile.ZipFile(self.template) as template:
+                self.assertEqual(sorted(saved.namelist()), sorted(template.namelist()))
+                for name in ('word/styles.xml', 'word/media/image1.png', '_rels/.rels'):
+                    info, original = saved.getinfo(name), template.getinfo(name)
+                    self.assertEqual((info.CRC, info.compress_size), (original.CRC, original.compress_size))
+            self.assertEqual(read_part(output, 'word/styles.xml').tag, read_part(self.template, 'word/styles.xml').tag)
+
+    def test_iter_save_copies_untouched_parts(self):
+        # The chunks are written to an output that cannot seek
+        data = b''.join(DocxDocument(template_file=self.template).iter_save(chunk_size=100))
+        with zipfile.ZipFile(io.BytesIO(data)) as saved, zipfile.ZipFile(self.template) as template:
+            self.assertIsNone(saved.testzip())
+            for name in template.namelist():
+                self.assertEqual(saved.getinfo(name).CRC, template.getinfo(name).CRC)